@@ -3,18 +3,35 @@ Content Generation & Summarization API using Google Gemini
 Requires: pip install flask flask-cors google-generativeai
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 import google.generativeai as genai
 import os
+import hmac
+import math
+import time
 from dotenv import load_dotenv
-from prompts import get_prompt_template
+from prompts import get_prompt_template, get_summarization_prompt
+from history import HistoryStore
+from cancellation import CancellationRegistry, Cancelled, DuplicateRequest
+from budget import TokenBudget, estimate_tokens, generation_key, summary_key, TOKENS_UNIT
+from hedging import Hedger, size_bucket
+from router import ModelRouter
+from compression import compress
+from client_pool import ClientPool, sdk_supported
+import tracing
+from tracing import span
 
 # Load environment variables
 load_dotenv()
 
+MAX_TOKENS = genai.protos.Candidate.FinishReason.MAX_TOKENS
+
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["Server-Timing", "X-Request-ID"])
+tracing.init_app(app)
+profiler = tracing.SamplingProfiler(os.getenv('PROFILE_DIR', 'profiles'))
+cancellations = CancellationRegistry(os.getenv('CANCEL_DIR'))
 
 class ContentGenerator:
     """Handle content generation using Google Gemini API"""
@@ -26,33 +43,178 @@ class ContentGenerator:
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not found. Please set it as environment variable or pass it to constructor.")
         
-        # Configure Gemini
-        genai.configure(api_key=self.api_key)
+        # Explicit per-worker clients instead of genai.configure's global client,
+        # on SDK releases known to accept an injected client
+        self.pool = None
+        if sdk_supported():
+            self.pool = ClientPool(self.api_key)
+        else:
+            print(f"google-generativeai {genai.__version__} is not supported by the client pool; "
+                  "falling back to genai.configure")
+            genai.configure(api_key=self.api_key)
+        
+        # Route each request to a model tier (lite / flash / pro)
+        self.router = ModelRouter()
         
-        # Initialize the model - Use Gemini 2.5 Flash (latest available)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        # Explicit output limits and sampling settings per request
+        self.budget = TokenBudget()
+        
+        # Optional extractive pre-compression of summarization inputs
+        self.compress_default = os.getenv('COMPRESSION_ENABLED', 'false').lower() == 'true'
+        self.compress_target_tokens = int(os.getenv('COMPRESSION_TARGET_TOKENS', 4000))
+        
+        # Optional hedging of slow upstream calls (HEDGING_ENABLED=true)
+        self.hedger = None
+        if os.getenv('HEDGING_ENABLED', 'false').lower() == 'true':
+            self.hedger = Hedger(
+                percentile=float(os.getenv('HEDGE_PERCENTILE', 0.9)),
+                budget_ratio=float(os.getenv('HEDGE_BUDGET', 0.05)),
+                max_workers=int(os.getenv('HEDGE_WORKERS', 2 * int(os.getenv('GEMINI_POOL_SIZE', 8))))
+            )
         
         print("Gemini API initialized successfully!")
     
-    def generate_content(self, content_type, topic, tone="professional", length="medium"):
-        """Generate content using Gemini API"""
+    def _call_model(self, prompt, model_name, generation_config=None, cancel_token=None, hedge_key=None):
+        """Call the model, hedging slow calls when enabled, and feed the router's stats"""
+        start = time.monotonic()
+        try:
+            if self.hedger is None:
+                response = self._request(prompt, model_name, generation_config, cancel_token)
+            else:
+                response = self.hedger.call(
+                    (model_name,) + hedge_key,
+                    lambda token: self._request(prompt, model_name, generation_config, token),
+                    cancel_token
+                )
+        except Cancelled:
+            raise
+        except Exception:
+            self.router.record(model_name, time.monotonic() - start, ok=False)
+            raise
+        self.router.record(model_name, time.monotonic() - start, ok=True)
+        return response
+    
+    def _request(self, prompt, model_name, generation_config=None, cancel_token=None):
+        """Send one upstream call on a pooled client"""
+        if self.pool is None:
+            request_options = {"timeout": float(os.getenv('GEMINI_TIMEOUT', 120))}
+            return self._send(genai.GenerativeModel(model_name), prompt,
+                              generation_config, cancel_token, request_options)
         
-        prompt = get_prompt_template(content_type, topic, tone, length)
+        with self.pool.client() as client:
+            # GenerativeModel is cheap; a fresh one per call keeps the pooled
+            # client private to this thread
+            model = genai.GenerativeModel(model_name)
+            model._client = client
+            return self._send(model, prompt, generation_config, cancel_token,
+                              self.pool.request_options())
+    
+    @staticmethod
+    def _send(model, prompt, generation_config, cancel_token, request_options):
+        """Call the model, streaming when cancellable so a cancel stops it"""
+        if cancel_token is None:
+            return model.generate_content(
+                prompt, generation_config=generation_config, request_options=request_options
+            )
+        
+        cancel_token.raise_if_cancelled()
+        response = model.generate_content(
+            prompt, generation_config=generation_config, stream=True, request_options=request_options
+        )
+        for _ in response:
+            # Abandoning the stream closes the upstream call
+            cancel_token.raise_if_cancelled()
+        return response
+    
+    def _generate(self, prompt, model_name, config, cancel_token, hedge_key):
+        """
+        Call the model, retrying once with a larger limit if the output was cut off
+
+        Returns:
+            (response, text, config, truncated) tuple, with the config actually used
+        """
+        response = self._call_model(prompt, model_name, config, cancel_token, hedge_key)
+        text, truncated = self._output_text(response)
+        retry_config = self.budget.for_retry(config) if truncated else None
+        if retry_config:
+            config = retry_config
+            response = self._call_model(prompt, model_name, config, cancel_token, hedge_key)
+            text, truncated = self._output_text(response)
+        return response, text, config, truncated
+    
+    @staticmethod
+    def _output_text(response):
+        """
+        Return (text, truncated) for a response
+        
+        Output cut off at max_output_tokens may hold partial text or none at
+        all (when thinking used the whole budget), where response.text raises.
+        """
+        candidate = response.candidates[0] if response.candidates else None
+        if candidate is not None and candidate.finish_reason == MAX_TOKENS:
+            return "".join(part.text for part in candidate.content.parts), True
+        return response.text, False
+    
+    @staticmethod
+    def _truncated_error(config):
+        return {
+            "success": False,
+            "error": f"Model reached max_output_tokens ({config['max_output_tokens']}) before producing any text",
+            "truncated": True
+        }
+    
+    @staticmethod
+    def _output_tokens(response, text):
+        """Output tokens reported by the API, or an estimate if unavailable"""
+        usage = getattr(response, "usage_metadata", None)
+        count = getattr(usage, "candidates_token_count", None) if usage else None
+        return count or estimate_tokens(text)
+    
+    def generate_content(self, content_type, topic, tone="professional", length="medium",
+                         cancel_token=None, model_tier=None):
+        """Generate content using Gemini API"""
         
         try:
+            with span("prompt"):
+                # The template formats any topic, so non-string topics keep working
+                topic, _ = self.budget.trim_topic(str(topic))
+                prompt = get_prompt_template(content_type, topic, tone, length)
+                config = self.budget.for_generation(content_type, length)
+                tier, model_name = self.router.choose(
+                    "generate", content_type=content_type, length=length,
+                    input_tokens=estimate_tokens(prompt), requested_tier=model_tier
+                )
+            
             # Generate content
-            response = self.model.generate_content(prompt)
+            with span("upstream"):
+                response, generated_text, config, truncated = self._generate(
+                    prompt, model_name, config, cancel_token,
+                    hedge_key=("generate",) + generation_key(content_type, length)
+                )
             
-            generated_text = response.text
+            if not generated_text and truncated:
+                return self._truncated_error(config)
             
-            # Count tokens (approximate)
-            token_count = len(generated_text.split())
+            token_count = self._output_tokens(response, generated_text)
+            if not truncated:
+                # A cut-off output understates the size this kind needs
+                self.budget.observe_generation(content_type, length, token_count)
             
             return {
                 "success": True,
                 "content": generated_text,
-                "model": "gemini-2.5-flash",
-                "tokens_used": token_count
+                "model": model_name,
+                "model_tier": tier,
+                "tokens_used": token_count,
+                "max_output_tokens": config["max_output_tokens"],
+                "truncated": truncated
+            }
+        
+        except Cancelled:
+            return {
+                "success": False,
+                "error": "Request cancelled",
+                "cancelled": True
             }
         
         except Exception as e:
@@ -61,30 +223,65 @@ class ContentGenerator:
                 "error": str(e)
             }
     
-    def summarize_content(self, text, summary_type="brief", ratio=0.3):
+    def summarize_content(self, text, summary_type="brief", ratio=0.3,
+                          cancel_token=None, model_tier=None,
+                          compress_input=None, target_tokens=None):
         """Summarize text using Gemini API"""
         
         try:
-            # Create summary prompt based on type
-            summary_prompts = {
-                "brief": f"Provide a brief summary of the following text in 2-3 sentences:\n\n{text}",
-                "detailed": f"Provide a detailed summary of the following text, covering all main points:\n\n{text}",
-                "bullet": f"Summarize the following text in bullet points (use • symbol):\n\n{text}",
-                "abstract": f"Write an abstract summarizing the following text:\n\n{text}"
-            }
+            compression = None
+            source = text
+            use_compression = compress_input if compress_input is not None else self.compress_default
+            if use_compression:
+                if target_tokens is None:
+                    target_tokens = self.compress_target_tokens
+                with span("compress"):
+                    source, compression = compress(text, target_tokens)
             
-            prompt = summary_prompts.get(summary_type, summary_prompts["brief"])
+            with span("prompt"):
+                source, trimmed = self.budget.trim_summary_input(source)
+                prompt = get_summarization_prompt(source, summary_type)
+                input_tokens = estimate_tokens(source)
+                # Size the summary from the full document, not the compressed input
+                config = self.budget.for_summary(summary_type, estimate_tokens(text), ratio)
+                tier, model_name = self.router.choose(
+                    "summarize", summary_type=summary_type,
+                    input_tokens=input_tokens, requested_tier=model_tier
+                )
             
             # Generate summary
-            response = self.model.generate_content(prompt)
-            summary = response.text
+            with span("upstream"):
+                response, summary, config, truncated = self._generate(
+                    prompt, model_name, config, cancel_token,
+                    hedge_key=("summarize", summary_key(summary_type), size_bucket(input_tokens))
+                )
+            
+            if not summary and truncated:
+                return self._truncated_error(config)
+            
+            token_count = self._output_tokens(response, summary)
+            if not truncated:
+                self.budget.observe_summary(summary_type, token_count)
             
             return {
                 "success": True,
                 "summary": summary,
                 "original_length": len(text.split()),
                 "summary_length": len(summary.split()),
-                "model": "gemini-2.5-flash"
+                "model": model_name,
+                "model_tier": tier,
+                "tokens_used": token_count,
+                "max_output_tokens": config["max_output_tokens"],
+                "truncated": truncated,
+                "input_trimmed": trimmed,
+                "compression": compression
+            }
+        
+        except Cancelled:
+            return {
+                "success": False,
+                "error": "Request cancelled",
+                "cancelled": True
             }
         
         except Exception as e:
@@ -104,16 +301,27 @@ except ValueError as e:
     print("Please set GEMINI_API_KEY environment variable before running.")
     generator = None
 
+# Generation history (set HISTORY_ENABLED=false to disable)
+history = None
+if os.getenv('HISTORY_ENABLED', 'true').lower() != 'false':
+    history = HistoryStore(os.getenv('HISTORY_DB_PATH', 'history.db'))
+    if generator:
+        # Start budgets from real output sizes instead of the static defaults
+        generator.budget.load_history(history)
+
 @app.route('/')
 def home():
     return jsonify({
         "message": "Content Generation & Summarization API (Google Gemini)",
         "version": "2.0 - Gemini Edition",
-        "model": "gemini-2.5-flash",
+        "models": generator.router.tiers if generator else None,
         "endpoints": {
             "/api/generate": "POST - Generate content",
             "/api/summarize": "POST - Summarize text",
             "/api/content-types": "GET - Get available content types",
+            "/api/cancel": "POST - Cancel an in-flight request",
+            "/api/history": "GET - List past generations and summaries (admin)",
+            "/api/history/search": "GET - Full-text search over history (admin)",
             "/api/health": "GET - Health check"
         },
         "note": "Requires GEMINI_API_KEY environment variable"
@@ -124,9 +332,22 @@ def health_check():
     return jsonify({
         "status": "healthy" if generator else "error",
         "service": "Content Gen & Summarization (Gemini)",
-        "api_configured": generator is not None
+        "api_configured": generator is not None,
+        "hedging": generator.hedger.stats() if generator and generator.hedger else None,
+        "router": generator.router.stats() if generator else None,
+        "client_pool": generator.pool.stats() if generator and generator.pool else None,
+        "history": history.stats() if history else None
     })
 
+def _is_positive_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+def _status_for(result):
+    """HTTP status for a generator result (499 = client closed request)"""
+    if result['success']:
+        return 200
+    return 499 if result.get('cancelled') else 500
+
 @app.route('/api/generate', methods=['POST'])
 def generate_content():
     """Generate content endpoint"""
@@ -150,12 +371,38 @@ def generate_content():
         tone = data.get('tone', 'professional')
         length = data.get('length', 'medium')
         
-        result = generator.generate_content(content_type, topic, tone, length)
+        request_id = g.trace.request_id
+        try:
+            cancel_token = cancellations.register(request_id)
+        except DuplicateRequest:
+            return jsonify({
+                "success": False,
+                "error": f"Request {request_id} is already in progress; use a unique X-Request-ID"
+            }), 409
+        start = time.perf_counter()
+        try:
+            result = generator.generate_content(
+                content_type, topic, tone, length, cancel_token, data.get('model_tier')
+            )
+        finally:
+            cancellations.release(request_id)
+        latency_ms = (time.perf_counter() - start) * 1000
+        
+        if result['success'] and history:
+            history.record(
+                "generate", topic, result['content'],
+                model=result.get('model'),
+                tokens_used=result.get('tokens_used'),
+                latency_ms=latency_ms,
+                params={
+                    "content_type": content_type, "tone": tone, "length": length,
+                    "tokens_unit": TOKENS_UNIT, "truncated": result['truncated']
+                }
+            )
         
-        if result['success']:
-            return jsonify(result), 200
-        else:
-            return jsonify(result), 500
+        with span("serialize"):
+            response = jsonify(result)
+        return response, _status_for(result)
     
     except Exception as e:
         return jsonify({
@@ -183,7 +430,21 @@ def summarize_content():
         
         text = data.get('text')
         summary_type = data.get('summary_type', 'brief')
-        ratio = data.get('ratio', 0.3)
+        
+        if not isinstance(text, str):
+            return jsonify({
+                "success": False,
+                "error": "text must be a string"
+            }), 400
+        try:
+            ratio = float(data.get('ratio', 0.3))
+            if not 0 < ratio <= 1:
+                raise ValueError
+        except (TypeError, ValueError):
+            return jsonify({
+                "success": False,
+                "error": "ratio must be a number greater than 0 and at most 1"
+            }), 400
         
         if len(text.split()) < 50:
             return jsonify({
@@ -191,12 +452,46 @@ def summarize_content():
                 "error": "Text too short. Please provide at least 50 words."
             }), 400
         
-        result = generator.summarize_content(text, summary_type, ratio)
+        compress_target_tokens = data.get('compress_target_tokens')
+        if compress_target_tokens is not None and not _is_positive_int(compress_target_tokens):
+            return jsonify({
+                "success": False,
+                "error": "compress_target_tokens must be a positive integer"
+            }), 400
         
-        if result['success']:
-            return jsonify(result), 200
-        else:
-            return jsonify(result), 500
+        request_id = g.trace.request_id
+        try:
+            cancel_token = cancellations.register(request_id)
+        except DuplicateRequest:
+            return jsonify({
+                "success": False,
+                "error": f"Request {request_id} is already in progress; use a unique X-Request-ID"
+            }), 409
+        start = time.perf_counter()
+        try:
+            result = generator.summarize_content(
+                text, summary_type, ratio, cancel_token, data.get('model_tier'),
+                data.get('compress'), compress_target_tokens
+            )
+        finally:
+            cancellations.release(request_id)
+        latency_ms = (time.perf_counter() - start) * 1000
+        
+        if result['success'] and history:
+            history.record(
+                "summarize", text, result['summary'],
+                model=result.get('model'),
+                tokens_used=result.get('tokens_used'),
+                latency_ms=latency_ms,
+                params={
+                    "summary_type": summary_type, "ratio": ratio,
+                    "tokens_unit": TOKENS_UNIT, "truncated": result['truncated']
+                }
+            )
+        
+        with span("serialize"):
+            response = jsonify(result)
+        return response, _status_for(result)
     
     except Exception as e:
         return jsonify({
@@ -204,6 +499,21 @@ def summarize_content():
             "error": f"Server error: {str(e)}"
         }), 500
 
+@app.route('/api/cancel', methods=['POST'])
+def cancel_request():
+    """Cancel an in-flight generate/summarize request by its X-Request-ID"""
+    data = request.get_json(silent=True) or {}
+    request_id = data.get('request_id')
+    
+    if not request_id:
+        return jsonify({
+            "success": False,
+            "error": "Missing required field: request_id"
+        }), 400
+    
+    found = cancellations.cancel(request_id)
+    return jsonify({"success": True, "request_id": request_id, "found": found}), 202
+
 @app.route('/api/content-types', methods=['GET'])
 def get_content_types():
     """Return available content types"""
@@ -220,9 +530,106 @@ def get_content_types():
         "tones": ["professional", "casual", "friendly", "formal", "persuasive", "informative"],
         "lengths": ["short", "medium", "long"],
         "summary_types": ["brief", "detailed", "bullet", "abstract"],
-        "note": "Powered by Google Gemini API (gemini-2.5-flash)"
+        "model_tiers": ["lite", "flash", "pro"],
+        "note": "Powered by Google Gemini API"
     })
 
+def _history_page_args():
+    """Parse the shared limit/cursor/kind query parameters"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    cursor = request.args.get('cursor', type=int)
+    kind = request.args.get('kind')
+    return limit, cursor, kind
+
+def _history_denied():
+    """Error response if history can't be served to this caller, else None"""
+    if not history:
+        return jsonify({"success": False, "error": "History is disabled"}), 404
+    # History holds every prompt and full summarization input, so reading it
+    # requires the admin token
+    if not _is_admin():
+        return jsonify({"success": False, "error": "Admin token required"}), 403
+    return None
+
+@app.route('/api/history', methods=['GET'])
+def list_history():
+    """List past generations and summaries, newest first"""
+    denied = _history_denied()
+    if denied:
+        return denied
+    
+    limit, cursor, kind = _history_page_args()
+    page = history.list(limit=limit, cursor=cursor, kind=kind)
+    return jsonify({"success": True, **page})
+
+@app.route('/api/history/search', methods=['GET'])
+def search_history():
+    """Full-text search over past inputs and outputs"""
+    denied = _history_denied()
+    if denied:
+        return denied
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({
+            "success": False,
+            "error": "Missing required query parameter: q"
+        }), 400
+    
+    limit, cursor, kind = _history_page_args()
+    page = history.search(query, limit=limit, cursor=cursor, kind=kind)
+    return jsonify({"success": True, **page})
+
+@app.route('/api/history/<int:entry_id>', methods=['GET'])
+def get_history_entry(entry_id):
+    """Return a single history entry"""
+    denied = _history_denied()
+    if denied:
+        return denied
+    
+    entry = history.get(entry_id)
+    if not entry:
+        return jsonify({"success": False, "error": "History entry not found"}), 404
+    return jsonify({"success": True, "entry": entry})
+
+def _is_admin():
+    """Check the X-Admin-Token header against ADMIN_TOKEN"""
+    token = os.getenv('ADMIN_TOKEN')
+    supplied = request.headers.get('X-Admin-Token', '')
+    return bool(token) and hmac.compare_digest(supplied, token)
+
+@app.route('/api/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """Start the sampling profiler (POST) or fetch the latest profile (GET)"""
+    if not _is_admin():
+        return jsonify({"success": False, "error": "Admin token required"}), 403
+    
+    if request.method == 'GET':
+        latest = profiler.latest_output()
+        if request.args.get('download') and latest:
+            with open(latest) as f:
+                return f.read(), 200, {"Content-Type": "text/plain; charset=utf-8"}
+        return jsonify({"success": True, **profiler.status()})
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        seconds = float(data.get('seconds', 10))
+        interval_ms = float(data.get('interval_ms', 5))
+        if math.isnan(seconds) or math.isnan(interval_ms):
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({
+            "success": False,
+            "error": "seconds and interval_ms must be numbers"
+        }), 400
+    seconds = min(max(seconds, 1), 300)
+    interval = min(max(interval_ms, 1), 1000) / 1000
+    
+    output = profiler.start(seconds, interval)
+    if output is None:
+        return jsonify({"success": False, "error": "Profiler already running", **profiler.status()}), 409
+    return jsonify({"success": True, "output": output, **profiler.status()}), 202
+
 if __name__ == '__main__':
     # You can set the API key here for testing (not recommended for production)
     # os.environ['GEMINI_API_KEY'] = 'your-api-key-here'
@@ -0,0 +1,336 @@
+"""
+Offline Batch Runner
+Streams a JSONL file of generate/summarize jobs through the same prompts and
+model as the API, writing results incrementally and checkpointing progress
+so an interrupted run can resume without redoing finished items.
+
+Usage:
+    python batch.py jobs.jsonl results.jsonl --concurrency 4 --rpm 60
+
+Each input line is a JSON object:
+    {"id": "a1", "task": "generate", "content_type": "blog", "topic": "...", "tone": "casual", "length": "short"}
+    {"id": "b7", "task": "summarize", "text": "...", "summary_type": "bullet"}
+
+`task` may be omitted - lines with "text" are summarized, everything else is
+generated. Each output line is {"line": n, "id": ..., "result": {...}}.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from budget import TOKENS_UNIT
+
+
+class RateLimiter:
+    """Space job starts evenly so at most `per_minute` start per minute"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait_for = self._next - now
+            self._next = max(self._next, now) + self.interval
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+
+class Checkpoint:
+    """
+    Track finished line numbers compactly
+
+    Everything below `watermark` is finished; `done` only holds lines above
+    the watermark that finished out of order. One slow line holds the
+    watermark in place, so `done` grows with the lines finished after it
+    until it completes.
+
+    Failed results count as finished. With `retry_failed`, lines whose
+    latest result failed are run again on resume; `retry` holds them.
+    """
+
+    def __init__(self, path, retry_failed=False):
+        self.path = path
+        self.retry_failed = retry_failed
+        self.watermark = 0
+        self.done = set()
+        self.retry = set()
+
+    def load(self, output_path):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.watermark = json.load(f).get("watermark", 0)
+
+        # Results written after the last checkpoint are still finished work
+        if os.path.exists(output_path):
+            _truncate_partial_line(output_path)
+            with open(output_path) as f:
+                for raw in f:
+                    try:
+                        entry = json.loads(raw)
+                        line_no = entry["line"]
+                        failed = entry.get("result", {}).get("success") is False
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        continue
+                    if line_no >= self.watermark:
+                        self.done.add(line_no)
+                    # A later result for the same line supersedes earlier ones
+                    if self.retry_failed and failed:
+                        self.retry.add(line_no)
+                    else:
+                        self.retry.discard(line_no)
+            self._advance()
+
+    def is_done(self, line_no):
+        if line_no in self.retry:
+            return False
+        return line_no < self.watermark or line_no in self.done
+
+    def mark(self, line_no):
+        self.retry.discard(line_no)
+        if line_no >= self.watermark:
+            self.done.add(line_no)
+            self._advance()
+
+    def _advance(self):
+        while self.watermark in self.done:
+            self.done.remove(self.watermark)
+            self.watermark += 1
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"watermark": self.watermark, "updated_at": time.time()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+def _truncate_partial_line(path):
+    """Drop a half-written last line left behind by a crash"""
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        pos = size
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            idx = chunk.rfind(b"\n")
+            if idx != -1:
+                f.truncate(pos + idx + 1)
+                return
+        f.truncate(0)
+
+
+def iter_jobs(path):
+    """Yield (line_no, raw_line) pairs lazily so memory stays flat"""
+    with open(path, encoding="utf-8") as f:
+        for line_no, raw in enumerate(f):
+            yield line_no, raw
+
+
+def run_job(generator, raw, retries=2, backoff=2.0, history=None):
+    """
+    Run a single job through the generator
+
+    Args:
+        generator: ContentGenerator instance
+        raw: Raw JSONL line
+        retries: Extra attempts for failed model calls
+        backoff: Base delay in seconds, doubled on each retry
+        history: Optional HistoryStore that successful results are recorded to
+
+    Returns:
+        (job_id, result) tuple
+    """
+    try:
+        job = json.loads(raw)
+    except ValueError as e:
+        return None, {"success": False, "error": f"Invalid JSON: {e}"}
+    if not isinstance(job, dict):
+        return None, {"success": False, "error": "Job must be a JSON object"}
+
+    job_id = job.get("id")
+    task = job.get("task") or ("summarize" if "text" in job else "generate")
+
+    if task == "generate":
+        if not job.get("content_type") or not job.get("topic"):
+            return job_id, {"success": False, "error": "Missing required fields: content_type and topic"}
+        if not isinstance(job["content_type"], str) or not isinstance(job["topic"], str):
+            return job_id, {"success": False, "error": "content_type and topic must be strings"}
+        params = {
+            "content_type": job["content_type"],
+            "tone": job.get("tone", "professional"),
+            "length": job.get("length", "medium")
+        }
+        source = job["topic"]
+        call = lambda: generator.generate_content(
+            job["content_type"], job["topic"], params["tone"], params["length"],
+            model_tier=job.get("model_tier")
+        )
+    elif task == "summarize":
+        if not job.get("text"):
+            return job_id, {"success": False, "error": "Missing required field: text"}
+        if not isinstance(job["text"], str):
+            return job_id, {"success": False, "error": "text must be a string"}
+        try:
+            ratio = float(job.get("ratio", 0.3))
+            if not 0 < ratio <= 1:
+                raise ValueError
+        except (TypeError, ValueError):
+            return job_id, {"success": False, "error": "ratio must be a number greater than 0 and at most 1"}
+        target_tokens = job.get("compress_target_tokens")
+        if target_tokens is not None and (
+                not isinstance(target_tokens, int) or isinstance(target_tokens, bool) or target_tokens <= 0):
+            return job_id, {"success": False, "error": "compress_target_tokens must be a positive integer"}
+        params = {"summary_type": job.get("summary_type", "brief"), "ratio": ratio}
+        source = job["text"]
+        call = lambda: generator.summarize_content(
+            job["text"], params["summary_type"], params["ratio"],
+            model_tier=job.get("model_tier"),
+            compress_input=job.get("compress"),
+            target_tokens=target_tokens
+        )
+    else:
+        return job_id, {"success": False, "error": f"Unknown task: {task}"}
+
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            result = call()
+        except Exception as e:
+            # The generator reports upstream failures itself, so this is a
+            # problem with the job; retrying won't help and it mustn't stop
+            # the run
+            return job_id, {"success": False, "error": f"{type(e).__name__}: {e}"}
+        if result["success"] or attempt == retries:
+            break
+        time.sleep(backoff * (2 ** attempt))
+
+    if result["success"] and history:
+        history.record(
+            task, source, result["content" if task == "generate" else "summary"],
+            model=result.get("model"),
+            tokens_used=result.get("tokens_used"),
+            latency_ms=(time.perf_counter() - start) * 1000,
+            params={**params, "tokens_unit": TOKENS_UNIT, "truncated": result.get("truncated", False)}
+        )
+    return job_id, result
+
+
+def run_batch(generator, input_path, output_path, checkpoint_path=None,
+              concurrency=4, rpm=0, retries=2, checkpoint_every=50, history=None,
+              retry_failed=False):
+    """
+    Process every job in `input_path`, appending results to `output_path`
+    (and to `history`, if given)
+
+    With `retry_failed`, lines whose last result in `output_path` failed
+    are run again.
+
+    Returns:
+        Dict of counts: processed, succeeded, failed, skipped
+    """
+    checkpoint = Checkpoint(checkpoint_path or output_path + ".ckpt", retry_failed)
+    checkpoint.load(output_path)
+    limiter = RateLimiter(rpm)
+    counts = {"processed": 0, "succeeded": 0, "failed": 0, "skipped": 0}
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=concurrency) as pool:
+
+        def handle(done):
+            for future in done:
+                line_no, job_id, result = future.result()
+                out.write(json.dumps({"line": line_no, "id": job_id, "result": result}) + "\n")
+                out.flush()
+                checkpoint.mark(line_no)
+                counts["processed"] += 1
+                counts["succeeded" if result["success"] else "failed"] += 1
+                if counts["processed"] % checkpoint_every == 0:
+                    os.fsync(out.fileno())
+                    checkpoint.save()
+                    print(f"[batch] {counts['processed']} processed, "
+                          f"watermark at line {checkpoint.watermark}", file=sys.stderr)
+
+        def task(line_no, raw):
+            job_id, result = run_job(generator, raw, retries=retries, history=history)
+            return line_no, job_id, result
+
+        pending = set()
+        for line_no, raw in iter_jobs(input_path):
+            if checkpoint.is_done(line_no):
+                counts["skipped"] += 1
+                continue
+            if not raw.strip():
+                checkpoint.mark(line_no)
+                continue
+
+            # Keep a bounded window of submitted jobs
+            while len(pending) >= concurrency * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                handle(done)
+
+            limiter.acquire()
+            pending.add(pool.submit(task, line_no, raw))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            handle(done)
+
+        out.flush()
+        os.fsync(out.fileno())
+        checkpoint.save()
+
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run generate/summarize jobs from a JSONL file")
+    parser.add_argument("input", help="Input JSONL file of jobs")
+    parser.add_argument("output", help="Output JSONL file (appended to on resume)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.ckpt)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel model calls (default: 4)")
+    parser.add_argument("--rpm", type=float, default=0, help="Max jobs started per minute (default: unlimited)")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per failed job (default: 2)")
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="Checkpoint interval in results (default: 50)")
+    parser.add_argument("--retry-failed", action="store_true", help="On resume, re-run lines whose last result failed")
+    args = parser.parse_args(argv)
+
+    from app import generator, history
+    if not generator:
+        print("Gemini API not configured. Please set GEMINI_API_KEY.", file=sys.stderr)
+        return 1
+
+    start = time.time()
+    counts = run_batch(
+        generator, args.input, args.output,
+        checkpoint_path=args.checkpoint,
+        concurrency=args.concurrency,
+        rpm=args.rpm,
+        retries=args.retries,
+        checkpoint_every=args.checkpoint_every,
+        history=history,
+        retry_failed=args.retry_failed
+    )
+    print(f"[batch] Done in {time.time() - start:.1f}s: {counts['processed']} processed "
+          f"({counts['succeeded']} ok, {counts['failed']} failed), {counts['skipped']} skipped",
+          file=sys.stderr)
+    return 0 if counts["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
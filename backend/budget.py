@@ -0,0 +1,245 @@
+"""
+Output Token Budgeting
+Maps content_type, length and summary settings to an explicit Gemini
+generation_config (max_output_tokens, temperature), refines the limits from
+observed output sizes, and trims over-long inputs before they are sent.
+"""
+
+import math
+import os
+import re
+import threading
+from collections import deque
+
+
+# Rough English average for Gemini's tokenizer
+TOKENS_PER_WORD = 1.35
+
+# Word ranges requested by get_prompt_template()
+LENGTH_WORDS = {
+    "short": (150, 200),
+    "medium": (400, 500),
+    "long": (800, 1000)
+}
+
+# Templates whose output size is set by the template itself
+CONTENT_TYPE_WORDS = {
+    "social": (300, 420),   # Tweet + LinkedIn (150-200) + Instagram (100-150)
+    "ad": (200, 300)        # Short-form (50-75) + long-form (150-200)
+}
+
+# Fixed-size summaries; "detailed" and "bullet" scale with the input
+SUMMARY_WORDS = {
+    "brief": (30, 80),
+    "abstract": (150, 250)
+}
+
+TEMPERATURES = {
+    "story": 0.9,
+    "ad": 0.8,
+    "social": 0.8,
+    "blog": 0.7,
+    "article": 0.6,
+    "product": 0.6,
+    "email": 0.5,
+    "summary": 0.3
+}
+
+
+# Types with a prompt template of their own (see prompts.py); any other value
+# gets the default template and shares its stats key, so client-supplied
+# values can't grow the per-kind stats without bound
+CONTENT_TYPES = frozenset(["blog", "email", "social", "product", "article", "story", "ad"])
+SUMMARY_TYPES = frozenset(["brief", "detailed", "bullet", "abstract"])
+
+# Marker stored in history params for entries whose tokens_used is in model
+# tokens; older entries recorded a word count
+TOKENS_UNIT = "tokens"
+
+
+def estimate_tokens(text):
+    """Approximate the token count of `text` from its word count"""
+    return math.ceil(len(text.split()) * TOKENS_PER_WORD)
+
+
+def words_to_tokens(words):
+    return math.ceil(words * TOKENS_PER_WORD)
+
+
+def generation_key(content_type, length):
+    """(content_type, length) for per-kind stats, with unknown values mapped to the defaults"""
+    return (
+        content_type if isinstance(content_type, str) and content_type in CONTENT_TYPES else "default",
+        length if isinstance(length, str) and length in LENGTH_WORDS else "medium"
+    )
+
+
+def summary_key(summary_type):
+    """summary_type for per-kind stats, with unknown values mapped to "brief" """
+    return summary_type if isinstance(summary_type, str) and summary_type in SUMMARY_TYPES else "brief"
+
+
+def trim_text(text, max_tokens):
+    """
+    Cut `text` to about `max_tokens` (at least one word), ending on a
+    sentence boundary
+
+    Returns:
+        (text, trimmed) tuple
+    """
+    words = text.split()
+    max_words = max(int(max_tokens / TOKENS_PER_WORD), 1)
+    if len(words) <= max_words:
+        return text, False
+
+    # Find the character offset of the cutoff word in the original text
+    offset = 0
+    for match in re.finditer(r"\S+", text):
+        max_words -= 1
+        if max_words < 0:
+            break
+        offset = match.end()
+    cut = text[:offset]
+
+    sentence_end = max(cut.rfind(". "), cut.rfind(".\n"), cut.rfind("? "), cut.rfind("! "))
+    if sentence_end > len(cut) * 0.8:
+        cut = cut[:sentence_end + 1]
+    return cut, True
+
+
+class TokenBudget:
+    """Choose generation settings per request and learn from real output sizes"""
+
+    def __init__(self, headroom=1.25, reasoning_reserve=None, max_input_tokens=None,
+                 max_topic_tokens=300, window=200, min_samples=20, max_output_tokens=None):
+        """
+        Args:
+            headroom: Multiplier over the requested size before cutting off
+            reasoning_reserve: Extra tokens for models that spend output tokens
+                on internal reasoning (gemini-2.5 "thinking")
+            max_output_tokens: Highest limit a retry after a cut-off output may use
+            max_input_tokens: Longest summarization input sent to the model
+            max_topic_tokens: Longest topic sent to the model
+            window: Observations kept per content key
+            min_samples: Observations needed before learned sizes are used
+        """
+        self.headroom = headroom
+        self.reasoning_reserve = reasoning_reserve if reasoning_reserve is not None else \
+            int(os.getenv('BUDGET_REASONING_RESERVE', 1024))
+        self.max_input_tokens = max_input_tokens or int(os.getenv('BUDGET_MAX_INPUT_TOKENS', 30000))
+        self.max_topic_tokens = max_topic_tokens
+        self.max_output_tokens = max_output_tokens or int(os.getenv('BUDGET_MAX_OUTPUT_TOKENS', 16384))
+        self.window = window
+        self.min_samples = min_samples
+
+        self._observed = {}
+        self._lock = threading.Lock()
+
+    # ==================== Limits ====================
+
+    def for_generation(self, content_type, length):
+        """Return a generation_config dict for get_prompt_template() output"""
+        content_type, length = generation_key(content_type, length)
+        low, high = LENGTH_WORDS[length]
+        if content_type in CONTENT_TYPE_WORDS:
+            type_low, type_high = CONTENT_TYPE_WORDS[content_type]
+            if content_type == "social":
+                # The social template ignores `length`
+                low, high = type_low, type_high
+            else:
+                low, high = max(low, type_low), max(high, type_high)
+
+        return {
+            "max_output_tokens": self._limit(("generate", content_type, length), low, high),
+            "temperature": TEMPERATURES.get(content_type, 0.7)
+        }
+
+    def for_summary(self, summary_type, input_tokens, ratio=0.3):
+        """Return a generation_config dict for get_summarization_prompt() output"""
+        summary_type = summary_key(summary_type)
+        if summary_type in SUMMARY_WORDS:
+            low, high = SUMMARY_WORDS[summary_type]
+            key = ("summarize", summary_type)
+        else:
+            # Scale with the input, within sensible bounds
+            target = (input_tokens / TOKENS_PER_WORD) * max(min(float(ratio), 1.0), 0.05)
+            low, high = max(min(target * 0.5, 600), 60), min(max(target, 120), 1200)
+            key = None
+
+        return {
+            "max_output_tokens": self._limit(key, low, high),
+            "temperature": TEMPERATURES["summary"]
+        }
+
+    def _limit(self, key, low_words, high_words):
+        base = words_to_tokens(high_words) * self.headroom
+        learned = self._learned_p95(key) if key else None
+        if learned is not None:
+            # Follow real output sizes, but never below the requested minimum
+            # nor above twice the static budget
+            base = min(max(learned * 1.1, words_to_tokens(low_words)), base * 2)
+        return int(base) + self.reasoning_reserve
+
+    def for_retry(self, config):
+        """
+        Return a generation_config with a doubled limit for one retry after
+        the output was cut off, or None if the limit is already at the cap
+        """
+        if config["max_output_tokens"] >= self.max_output_tokens:
+            return None
+        return {**config, "max_output_tokens": min(config["max_output_tokens"] * 2, self.max_output_tokens)}
+
+    # ==================== Learning ====================
+
+    def observe_generation(self, content_type, length, output_tokens):
+        self._observe(("generate",) + generation_key(content_type, length), output_tokens)
+
+    def observe_summary(self, summary_type, output_tokens):
+        summary_type = summary_key(summary_type)
+        if summary_type in SUMMARY_WORDS:
+            self._observe(("summarize", summary_type), output_tokens)
+
+    def _observe(self, key, output_tokens):
+        if not output_tokens:
+            return
+        with self._lock:
+            samples = self._observed.get(key)
+            if samples is None:
+                samples = self._observed[key] = deque(maxlen=self.window)
+            samples.append(output_tokens)
+
+    def _learned_p95(self, key):
+        with self._lock:
+            samples = self._observed.get(key)
+            if not samples or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+    def load_history(self, history, limit=5000):
+        """
+        Seed observed output sizes from a HistoryStore
+
+        Only complete outputs recorded in model tokens are used; older entries
+        hold word counts and truncated outputs understate the real size.
+        """
+        # Rows come newest first; replay oldest first so the newest stay in the window
+        for row in reversed(history.output_sizes(limit)):
+            params = row["params"]
+            if params.get("tokens_unit") != TOKENS_UNIT or params.get("truncated"):
+                continue
+            if row["kind"] == "generate":
+                self.observe_generation(row["content_type"], row["length"], row["tokens_used"])
+            elif row["kind"] == "summarize":
+                self.observe_summary(row["summary_type"], row["tokens_used"])
+
+    # ==================== Input Trimming ====================
+
+    def trim(self, text, max_tokens):
+        return trim_text(text, max_tokens)
+
+    def trim_summary_input(self, text):
+        return self.trim(text, self.max_input_tokens)
+
+    def trim_topic(self, topic):
+        return self.trim(topic, self.max_topic_tokens)
@@ -0,0 +1,187 @@
+"""
+Request Cancellation
+Lets a client cancel an in-flight request by id so the upstream model call
+stops streaming and no longer consumes quota. Cancellations are recorded as
+marker files so they reach the request whichever gunicorn worker is
+running it.
+"""
+
+import os
+import re
+import tempfile
+import threading
+import time
+
+
+_VALID_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class Cancelled(Exception):
+    """Raised when work is abandoned because its request was cancelled"""
+
+
+class DuplicateRequest(Exception):
+    """Raised when a request id is already in flight in this worker"""
+
+
+class CancelToken:
+    """
+    Cancellation flag checked between chunks of an upstream call
+
+    A token with a `parent` is also cancelled when the parent is, which lets
+    one attempt of a request be abandoned without cancelling the request.
+    """
+
+    def __init__(self, marker=None, poll_interval=0.1, parent=None):
+        self._event = threading.Event()
+        self._parent = parent
+        self._marker = marker
+        self._poll_interval = poll_interval
+        self._next_poll = 0.0
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        if self._event.is_set():
+            return True
+        if self._parent is not None and self._parent.cancelled:
+            self._event.set()
+            return True
+        # Check the cross-worker marker at most every poll_interval
+        if self._marker:
+            now = time.monotonic()
+            if now >= self._next_poll:
+                self._next_poll = now + self._poll_interval
+                if os.path.exists(self._marker):
+                    self._event.set()
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise Cancelled()
+
+
+class CancellationRegistry:
+    """Track cancel tokens for in-flight requests by request id"""
+
+    def __init__(self, directory=None, marker_ttl=600, sweep_interval=60, max_markers=10000):
+        """
+        Args:
+            directory: Marker directory shared by every worker on the host
+            marker_ttl: Seconds after which a marker is removed
+            sweep_interval: Minimum seconds between sweeps of the directory
+            max_markers: Marker count that forces an early sweep, which also
+                removes the oldest markers until well below the cap
+        """
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "content-gen-cancel")
+        self.marker_ttl = marker_ttl
+        self.sweep_interval = sweep_interval
+        self.max_markers = max_markers
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+        self._markers = 0   # markers seen at the last sweep plus those written since
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _marker(self, request_id):
+        return os.path.join(self.directory, request_id)
+
+    def register(self, request_id):
+        """
+        Create the token for a request that is about to start
+
+        A cancel that arrived before the request started is honoured, since
+        its marker file already exists.
+
+        Raises:
+            DuplicateRequest: If the id is already in flight in this worker
+        """
+        if not request_id or not _VALID_ID.match(request_id):
+            return CancelToken()
+        token = CancelToken(self._marker(request_id))
+        with self._lock:
+            if request_id in self._tokens:
+                raise DuplicateRequest(request_id)
+            self._tokens[request_id] = token
+        return token
+
+    def release(self, request_id):
+        """Forget a finished request and remove its marker"""
+        with self._lock:
+            self._tokens.pop(request_id, None)
+        if request_id and _VALID_ID.match(request_id):
+            try:
+                os.remove(self._marker(request_id))
+            except OSError:
+                pass
+
+    def cancel(self, request_id):
+        """
+        Cancel a request by id
+
+        Returns:
+            True if the request was running in this worker, False if the
+            cancellation was only recorded for another worker to pick up
+        """
+        if not request_id or not _VALID_ID.match(request_id):
+            return False
+        with open(self._marker(request_id), "w"):
+            pass
+        self._maybe_sweep()
+
+        with self._lock:
+            token = self._tokens.get(request_id)
+        if token:
+            token.cancel()
+            return True
+        return False
+
+    def _maybe_sweep(self):
+        # Scan the directory on a timer, or early once the cap is reached,
+        # rather than on every cancel
+        with self._lock:
+            self._markers += 1
+            now = time.monotonic()
+            if now < self._next_sweep and self._markers < self.max_markers:
+                return
+            self._next_sweep = now + self.sweep_interval
+            self._markers = 0
+        self._sweep()
+
+    def _sweep(self):
+        """Remove expired markers, then the oldest ones past the cap"""
+        cutoff = time.time() - self.marker_ttl
+        markers = []
+        try:
+            for entry in os.scandir(self.directory):
+                try:
+                    mtime = entry.stat().st_mtime
+                except OSError:
+                    continue
+                if mtime < cutoff:
+                    _remove(entry.path)
+                else:
+                    markers.append((mtime, entry.path))
+        except OSError:
+            pass
+
+        # Trim to 90% of the cap so a flood of cancels doesn't force a
+        # sweep on every call
+        keep = self.max_markers * 9 // 10
+        if len(markers) > keep:
+            markers.sort()
+            for _, path in markers[:len(markers) - keep]:
+                _remove(path)
+            markers = markers[len(markers) - keep:]
+
+        with self._lock:
+            self._markers += len(markers)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
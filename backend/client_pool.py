@@ -0,0 +1,250 @@
+"""
+Gemini Client Pool
+Per-worker pool of explicit Gemini API clients, each owning a persistent
+connection (a gRPC channel with keep-alive, or a pooled HTTP session for the
+REST transport). Replaces the process-global client set up by
+genai.configure, resets itself cleanly after a fork, and reports usage stats.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+API_HOST = "generativelanguage.googleapis.com"
+
+# GenerativeModel has no public way to take a client, so callers set its
+# private `_client`; that is only known to work on these releases
+SUPPORTED_SDK_VERSIONS = ("0.8.",)
+
+
+def sdk_supported():
+    """Whether the installed google-generativeai accepts an injected client"""
+    import google.generativeai as genai
+    return genai.__version__.startswith(SUPPORTED_SDK_VERSIONS)
+
+
+def create_client(api_key, transport="grpc", keepalive_ms=30000):
+    """
+    Build one GenerativeServiceClient with its own connection
+
+    Args:
+        api_key: Gemini API key
+        transport: "grpc" (one HTTP/2 channel per client) or "rest"
+        keepalive_ms: gRPC keep-alive ping interval
+
+    Returns:
+        A google.ai.generativelanguage GenerativeServiceClient
+    """
+    from google.ai import generativelanguage as glm
+
+    if transport == "rest":
+        return glm.GenerativeServiceClient(transport="rest", client_options={"api_key": api_key})
+
+    from google.ai.generativelanguage_v1beta.services.generative_service.transports import (
+        GenerativeServiceGrpcTransport
+    )
+    from google.auth import api_key as api_key_credentials
+
+    channel = GenerativeServiceGrpcTransport.create_channel(
+        API_HOST,
+        credentials=api_key_credentials.Credentials(api_key),
+        options=[
+            ("grpc.keepalive_time_ms", keepalive_ms),
+            ("grpc.keepalive_timeout_ms", 10000),
+            ("grpc.keepalive_permit_without_calls", 1),
+            ("grpc.max_receive_message_length", 32 * 1024 * 1024)
+        ]
+    )
+    return glm.GenerativeServiceClient(transport=GenerativeServiceGrpcTransport(channel=channel))
+
+
+def connection_errors():
+    """
+    Exception types meaning a client's connection failed, as opposed to the
+    call (quota, bad request, timeout), which a healthy connection survives
+    """
+    errors = []
+    try:
+        from google.api_core import exceptions
+        errors.append(exceptions.ServiceUnavailable)
+    except ImportError:
+        pass
+    try:
+        import requests
+        errors.append(requests.exceptions.ConnectionError)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+def close_client(client):
+    """Close a client's connection, ignoring errors from an already broken one"""
+    transport = getattr(client, "transport", None)
+    if transport is not None and hasattr(transport, "close"):
+        try:
+            transport.close()
+        except Exception:
+            pass
+
+
+class ClientPool:
+    """Thread-safe pool of Gemini clients for one worker process"""
+
+    def __init__(self, api_key, size=None, transport=None, timeout=None,
+                 keepalive_ms=None, acquire_timeout=30, factory=None, broken_errors=None):
+        """
+        Args:
+            api_key: Gemini API key
+            size: Maximum clients (and so upstream connections) per worker
+            transport: "grpc" or "rest"
+            timeout: Per-request upstream timeout in seconds
+            keepalive_ms: gRPC keep-alive ping interval
+            acquire_timeout: Seconds to wait for a free client before failing
+            factory: Callable returning a new client (defaults to create_client)
+            broken_errors: Exception types after which a client is discarded
+                (defaults to connection_errors())
+        """
+        self.api_key = api_key
+        self.size = size or int(os.getenv('GEMINI_POOL_SIZE', 8))
+        self.transport = transport or os.getenv('GEMINI_TRANSPORT', 'grpc')
+        self.timeout = timeout or float(os.getenv('GEMINI_TIMEOUT', 120))
+        self.keepalive_ms = keepalive_ms or int(os.getenv('GEMINI_KEEPALIVE_MS', 30000))
+        self.acquire_timeout = acquire_timeout
+        self._factory = factory or (
+            lambda: create_client(self.api_key, self.transport, self.keepalive_ms)
+        )
+        self.broken_errors = broken_errors if broken_errors is not None else connection_errors()
+
+        self._lock = threading.Lock()
+        self._reset()
+
+        # Connections must never be shared between a parent and a forked worker
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.close)
+
+    def _after_fork(self):
+        # Another thread may have held the lock at fork time
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # Drop (without closing) any clients inherited from a parent process
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._opened = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._discarded = 0
+
+    @contextmanager
+    def client(self):
+        """
+        Borrow a client for the duration of one upstream call
+
+        A client whose call failed at the connection level (broken_errors)
+        is closed rather than reused; other errors leave it in the pool.
+        """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+        client = self._acquire()
+        pid = self._pid
+        healthy = True
+        try:
+            yield client
+        except self.broken_errors:
+            healthy = False
+            raise
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                if pid == self._pid and not healthy:
+                    self._created -= 1
+                    self._discarded += 1
+            if pid == self._pid:
+                if healthy:
+                    self._idle.put(client)
+                else:
+                    close_client(client)
+
+    def _acquire(self):
+        # Most recently used first, so warm connections are reused
+        try:
+            client = self._idle.get_nowait()
+        except queue.Empty:
+            client = None
+
+        if client is None:
+            create = False
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+            if create:
+                try:
+                    client = self._factory()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+                with self._lock:
+                    self._opened += 1
+            else:
+                start = time.monotonic()
+                try:
+                    client = self._idle.get(timeout=self.acquire_timeout)
+                except queue.Empty:
+                    raise TimeoutError(
+                        f"No Gemini client free after {self.acquire_timeout}s (pool size {self.size})"
+                    )
+                finally:
+                    with self._lock:
+                        self._waits += 1
+                        self._wait_seconds += time.monotonic() - start
+
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+        return client
+
+    def request_options(self):
+        """request_options to pass to GenerativeModel.generate_content"""
+        return {"timeout": self.timeout}
+
+    def close(self):
+        """Close every idle client's connection (also run at exit)"""
+        while True:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            close_client(client)
+            with self._lock:
+                self._created -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pid": self._pid,
+                "transport": self.transport,
+                "size": self.size,
+                "open": self._created,
+                "opened_total": self._opened,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "acquired": self._acquired,
+                "reused": self._acquired - self._opened,
+                "discarded": self._discarded,
+                "waits": self._waits,
+                "wait_ms": round(self._wait_seconds * 1000, 1)
+            }
@@ -0,0 +1,173 @@
+"""
+Extractive Pre-Compression
+Shrinks long inputs before summarization: removes near-duplicate paragraphs,
+scores sentences with local word statistics and drops the lowest-value ones
+until the text fits an input-token budget. Runs locally with no model calls.
+"""
+
+import re
+from collections import Counter
+
+from budget import estimate_tokens, trim_text
+
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been
+before being below between both but by can could did do does doing down during each
+few for from further had has have having he her here hers him his how i if in into is
+it its itself just me more most my no nor not now of off on once only or other our ours
+out over own same she should so some such than that the their theirs them then there
+these they this those through to too under until up very was we were what when where
+which while who whom why will with would you your yours
+""".split())
+
+BOILERPLATE = re.compile(
+    r"(all rights reserved|copyright|©|click here|subscribe|sign up|newsletter|"
+    r"cookie|privacy policy|terms of (use|service)|share this|follow us|read more|"
+    r"advertisement|skip to (main )?content)",
+    re.IGNORECASE
+)
+
+_PARAGRAPH_SPLIT = re.compile(r"\n\s*\n")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])")
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def _shingles(words, size=3):
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def dedupe_paragraphs(paragraphs, threshold=0.8):
+    """
+    Drop paragraphs that repeat an earlier one
+
+    Two paragraphs are near-duplicates when the Jaccard similarity of their
+    word 3-gram sets reaches `threshold`.
+
+    Returns:
+        (kept_paragraphs, removed_count) tuple
+    """
+    kept = []
+    kept_shingles = []
+    index = {}      # shingle -> ids of kept paragraphs containing it
+    removed = 0
+
+    for paragraph in paragraphs:
+        shingles = _shingles(_WORD.findall(paragraph.lower()))
+        overlaps = Counter()
+        for shingle in shingles:
+            for kept_id in index.get(shingle, ()):
+                overlaps[kept_id] += 1
+
+        duplicate = False
+        for kept_id, shared in overlaps.items():
+            union = len(shingles) + len(kept_shingles[kept_id]) - shared
+            if union and shared / union >= threshold:
+                duplicate = True
+                break
+        if duplicate:
+            removed += 1
+            continue
+
+        kept_id = len(kept)
+        kept.append(paragraph)
+        kept_shingles.append(shingles)
+        for shingle in shingles:
+            index.setdefault(shingle, []).append(kept_id)
+
+    return kept, removed
+
+
+def score_sentences(paragraphs):
+    """
+    Score every sentence by the salience of its content words
+
+    Returns:
+        List of (paragraph_index, sentence, score) in document order
+    """
+    sentences = []
+    for p_index, paragraph in enumerate(paragraphs):
+        for s_index, sentence in enumerate(_SENTENCE_SPLIT.split(paragraph.strip())):
+            if sentence.strip():
+                sentences.append((p_index, s_index, sentence.strip()))
+
+    tokenized = [
+        [w for w in _WORD.findall(sentence.lower()) if w not in STOPWORDS]
+        for _, _, sentence in sentences
+    ]
+    frequencies = Counter(w for words in tokenized for w in words)
+    top = max(frequencies.values()) if frequencies else 1
+
+    scored = []
+    for (p_index, s_index, sentence), words in zip(sentences, tokenized):
+        if words:
+            score = sum(frequencies[w] for w in words) / (top * len(words) ** 0.5)
+        else:
+            score = 0.0
+        # Leading sentences usually carry the topic of their paragraph
+        if s_index == 0:
+            score *= 1.3
+        if p_index == 0:
+            score *= 1.2
+        if len(words) < 3:
+            score *= 0.5
+        if BOILERPLATE.search(sentence):
+            score *= 0.1
+        scored.append((p_index, sentence, score))
+    return scored
+
+
+def compress(text, target_tokens):
+    """
+    Compress `text` to roughly `target_tokens` input tokens
+
+    Args:
+        text: Source text
+        target_tokens: Input-token budget for the compressed text
+
+    The highest-scoring sentence is always kept, cut down to the budget
+    if it is longer on its own.
+
+    Returns:
+        (compressed_text, stats) tuple; stats reports the tokens before and
+        after, the ratio, duplicate paragraphs removed and sentences dropped
+    """
+    original_tokens = estimate_tokens(text)
+    paragraphs = [p for p in _PARAGRAPH_SPLIT.split(text) if p.strip()]
+    paragraphs, duplicates = dedupe_paragraphs(paragraphs)
+
+    scored = score_sentences(paragraphs)
+    dropped = 0
+    total = sum(estimate_tokens(sentence) for _, sentence, _ in scored)
+
+    if total > target_tokens:
+        # Drop the lowest-scoring sentences until the rest fits, keeping the best
+        keep = [True] * len(scored)
+        for i in sorted(range(len(scored)), key=lambda i: scored[i][2])[:-1]:
+            if total <= target_tokens:
+                break
+            keep[i] = False
+            total -= estimate_tokens(scored[i][1])
+            dropped += 1
+        scored = [s for s, k in zip(scored, keep) if k]
+
+        if total > target_tokens and len(scored) == 1:
+            p_index, sentence, score = scored[0]
+            scored = [(p_index, trim_text(sentence, target_tokens)[0], score)]
+
+    # Reassemble in the original order, one paragraph per source paragraph
+    rebuilt = {}
+    for p_index, sentence, _ in scored:
+        rebuilt.setdefault(p_index, []).append(sentence)
+    compressed = "\n\n".join(" ".join(rebuilt[i]) for i in sorted(rebuilt))
+
+    compressed_tokens = estimate_tokens(compressed)
+    return compressed, {
+        "original_tokens": original_tokens,
+        "compressed_tokens": compressed_tokens,
+        "ratio": round(compressed_tokens / original_tokens, 3) if original_tokens else 1.0,
+        "duplicate_paragraphs": duplicates,
+        "sentences_dropped": dropped
+    }
@@ -0,0 +1,171 @@
+"""
+Hedged Upstream Requests
+If an upstream call has not answered within the observed latency percentile
+for its kind of request, a second identical call is sent and whichever
+finishes first wins; the other is cancelled. A global budget caps how many
+extra calls hedging may add.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from cancellation import CancelToken, Cancelled
+
+
+# Summarization latency grows with the input, so it is tracked per size bucket
+SIZE_BUCKETS = (1000, 4000, 16000)
+
+
+def size_bucket(tokens):
+    """Coarse input-size label for a latency key"""
+    for bound in SIZE_BUCKETS:
+        if tokens <= bound:
+            return f"<={bound}"
+    return f">{SIZE_BUCKETS[-1]}"
+
+
+class LatencyTracker:
+    """Rolling window of call latencies per key"""
+
+    def __init__(self, window=200, min_samples=20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, key, q):
+        """Return the q-th percentile (0-1) in seconds, or None without enough samples"""
+        with self._lock:
+            samples = self._samples.get(key)
+            if not samples or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class HedgeBudget:
+    """
+    Token bucket limiting hedges to a fraction of primary calls
+
+    Each primary call earns `ratio` tokens (up to `burst`); each hedge
+    spends one.
+    """
+
+    def __init__(self, ratio=0.05, burst=10):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def on_primary(self):
+        with self._lock:
+            self._tokens = min(self._tokens + self.ratio, self.burst)
+
+    def try_acquire(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class Hedger:
+    """Run upstream calls with a latency-triggered backup request"""
+
+    def __init__(self, percentile=0.9, budget_ratio=0.05, min_samples=20, max_workers=32):
+        """
+        Args:
+            percentile: Latency percentile (0-1) after which a backup is sent
+            budget_ratio: Hedges allowed per primary call
+            min_samples: Timed calls of a kind needed before hedging it
+            max_workers: Threads running timed attempts; size it for a primary
+                and a backup per upstream connection so neither queues
+        """
+        self.percentile = percentile
+        self.tracker = LatencyTracker(min_samples=min_samples)
+        self.budget = HedgeBudget(budget_ratio)
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self.primaries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _attempt(self, key, fn, token):
+        start = time.monotonic()
+        result = fn(token)
+        self.tracker.record(key, time.monotonic() - start)
+        return result
+
+    def call(self, key, fn, cancel_token=None):
+        """
+        Call `fn(token)` and hedge it if it runs past the tracked percentile
+
+        Args:
+            key: Latency bucket, e.g. ("generate", content_type, length)
+            fn: Callable taking a CancelToken; must stop promptly once it fires
+            cancel_token: Optional token cancelling the whole request
+
+        Returns:
+            The result of whichever attempt finished first
+        """
+        with self._lock:
+            self.primaries += 1
+        self.budget.on_primary()
+
+        primary_token = CancelToken(parent=cancel_token)
+        delay = self.tracker.percentile(key, self.percentile)
+        if delay is None:
+            # Nothing to time against yet, so no backup: run in this thread
+            return self._attempt(key, fn, primary_token)
+
+        primary = self._pool.submit(self._attempt, key, fn, primary_token)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.budget.try_acquire():
+            return primary.result()
+
+        with self._lock:
+            self.hedges += 1
+        backup_token = CancelToken(parent=cancel_token)
+        backup = self._pool.submit(self._attempt, key, fn, backup_token)
+
+        attempts = {primary: primary_token, backup: backup_token}
+        pending = set(attempts)
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # Cancel the slower attempt so it stops consuming quota
+                    for other in pending:
+                        attempts[other].cancel()
+                    if future is backup:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                if first_error is None or future is primary:
+                    first_error = future.exception()
+
+        if cancel_token is not None and cancel_token.cancelled:
+            raise Cancelled()
+        raise first_error
+
+    def stats(self):
+        with self._lock:
+            return {
+                "percentile": self.percentile,
+                "budget_ratio": self.budget.ratio,
+                "max_workers": self.max_workers,
+                "primaries": self.primaries,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins
+            }
@@ -0,0 +1,307 @@
+"""
+Generation History Store
+Persists every generation and summary to SQLite (WAL mode) with an FTS5
+full-text index, so past results can be listed and searched instead of
+being regenerated.
+"""
+
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    content_type TEXT,
+    tone TEXT,
+    length TEXT,
+    summary_type TEXT,
+    input TEXT,
+    output TEXT,
+    model TEXT,
+    tokens_used INTEGER,
+    latency_ms REAL,
+    params TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_history_kind ON history (kind, id);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts
+    USING fts5(input, output, content='history', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+    INSERT INTO history_fts (rowid, input, output) VALUES (new.id, new.input, new.output);
+END;
+CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN
+    INSERT INTO history_fts (history_fts, rowid, input, output)
+        VALUES ('delete', old.id, old.input, old.output);
+END;
+"""
+
+COLUMNS = (
+    "kind", "content_type", "tone", "length", "summary_type",
+    "input", "output", "model", "tokens_used", "latency_ms", "params"
+)
+
+
+class HistoryStore:
+    """Record generations and summaries, and serve paginated listing and search"""
+
+    def __init__(self, path="history.db", batch_size=50, flush_interval=0.5, max_queue=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._queue = None
+        self._writer = None
+        self._writer_pid = None
+        self.dropped = 0
+        self.written = 0
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        try:
+            conn.executescript(FTS_SCHEMA)
+            self.fts_enabled = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5 - fall back to LIKE search
+            self.fts_enabled = False
+        conn.close()
+
+        atexit.register(self.flush)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        # One read connection per thread (and per process after a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ==================== Writes ====================
+
+    def record(self, kind, input_text, output, model=None, tokens_used=None,
+               latency_ms=None, params=None):
+        """
+        Queue a history entry without blocking the request
+
+        Args:
+            kind: "generate" or "summarize"
+            input_text: Topic or source text
+            output: Generated content or summary
+            model: Model name that produced the output
+            tokens_used: Token usage reported for the call
+            latency_ms: Time spent producing the output
+            params: Request parameters (content_type, tone, length, summary_type, ...)
+
+        Returns:
+            True if queued, False if the queue was full and the entry dropped
+        """
+        params = params or {}
+        row = (
+            kind,
+            params.get("content_type"),
+            params.get("tone"),
+            params.get("length"),
+            params.get("summary_type"),
+            input_text,
+            output,
+            model,
+            tokens_used,
+            latency_ms,
+            json.dumps(params),
+        )
+
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((time.time(),) + row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _ensure_writer(self):
+        # Started lazily so a pre-fork master never owns the writer thread
+        if self._writer_pid == os.getpid() and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid() and self._writer.is_alive():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._writer = threading.Thread(target=self._run_writer, name="history-writer", daemon=True)
+            self._writer_pid = os.getpid()
+            self._writer.start()
+
+    def _run_writer(self):
+        conn = self._connect()
+        q = self._queue
+        while True:
+            try:
+                batch = [q.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(conn, batch)
+            for _ in batch:
+                q.task_done()
+
+    def _write_batch(self, conn, batch):
+        placeholders = ", ".join("?" * (len(COLUMNS) + 1))
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO history (created_at, {', '.join(COLUMNS)}) VALUES ({placeholders})",
+                    batch
+                )
+            self.written += len(batch)
+        except sqlite3.Error as e:
+            self.dropped += len(batch)
+            print(f"History write failed: {e}")
+
+    def flush(self, timeout=10):
+        """
+        Wait until every queued entry has been written
+
+        Gives up after `timeout` seconds, or at once if the writer thread has
+        died, so exiting never hangs on entries that can't be written.
+
+        Returns:
+            True if the queue drained, False otherwise
+        """
+        if self._queue is None or self._writer_pid != os.getpid():
+            return True
+        q = self._queue
+        deadline = time.monotonic() + timeout
+        with q.all_tasks_done:
+            while q.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._writer.is_alive():
+                    print(f"History flush gave up with {q.unfinished_tasks} entries unwritten")
+                    return False
+                q.all_tasks_done.wait(min(remaining, 0.5))
+        return True
+
+    # ==================== Reads ====================
+
+    def get(self, entry_id):
+        """Return a single history entry or None"""
+        row = self._reader().execute("SELECT * FROM history WHERE id = ?", (entry_id,)).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def list(self, limit=20, cursor=None, kind=None):
+        """
+        List entries newest first using keyset pagination
+
+        Args:
+            limit: Page size
+            cursor: `next_cursor` from the previous page (an entry id)
+            kind: Optional filter, "generate" or "summarize"
+
+        Returns:
+            Dict with "items" and "next_cursor" (None on the last page)
+        """
+        sql = "SELECT * FROM history WHERE id < ?"
+        args = [cursor if cursor is not None else _MAX_ID]
+        if kind:
+            sql += " AND kind = ?"
+            args.append(kind)
+        sql += " ORDER BY id DESC LIMIT ?"
+        args.append(limit + 1)
+
+        rows = self._reader().execute(sql, args).fetchall()
+        return _page(rows, limit)
+
+    def search(self, query, limit=20, cursor=None, kind=None):
+        """
+        Full-text search over inputs and outputs, newest first
+
+        Args:
+            query: Free text; every term must match
+            limit: Page size
+            cursor: `next_cursor` from the previous page
+            kind: Optional filter, "generate" or "summarize"
+
+        Returns:
+            Dict with "items" and "next_cursor"
+        """
+        terms = query.split()
+        if not terms:
+            return {"items": [], "next_cursor": None}
+
+        args = []
+        if self.fts_enabled:
+            # Quote every term so user input can't inject FTS query syntax
+            match = " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+            sql = ("SELECT h.* FROM history_fts f JOIN history h ON h.id = f.rowid "
+                   "WHERE history_fts MATCH ? AND h.id < ?")
+            args += [match, cursor if cursor is not None else _MAX_ID]
+        else:
+            sql = "SELECT h.* FROM history h WHERE h.id < ?"
+            args.append(cursor if cursor is not None else _MAX_ID)
+            for t in terms:
+                sql += " AND (h.input LIKE ? OR h.output LIKE ?)"
+                args += [f"%{t}%", f"%{t}%"]
+        if kind:
+            sql += " AND h.kind = ?"
+            args.append(kind)
+        sql += " ORDER BY h.id DESC LIMIT ?"
+        args.append(limit + 1)
+
+        rows = self._reader().execute(sql, args).fetchall()
+        return _page(rows, limit)
+
+    def output_sizes(self, limit=5000):
+        """Return recent kind, content_type, length, summary_type, tokens_used and params"""
+        rows = self._reader().execute(
+            "SELECT kind, content_type, length, summary_type, tokens_used, params FROM history "
+            "WHERE tokens_used IS NOT NULL ORDER BY id DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [_row_to_dict(r) for r in rows]
+
+    def stats(self):
+        """Return writer statistics"""
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "writer_alive": bool(self._writer and self._writer.is_alive()),
+            "fts_enabled": self.fts_enabled
+        }
+
+
+_MAX_ID = 2 ** 63 - 1
+
+
+def _row_to_dict(row):
+    item = dict(row)
+    item["params"] = json.loads(item["params"]) if item.get("params") else {}
+    return item
+
+
+def _page(rows, limit):
+    items = [_row_to_dict(r) for r in rows[:limit]]
+    next_cursor = items[-1]["id"] if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
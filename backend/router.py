@@ -0,0 +1,201 @@
+"""
+Model Router
+Picks a Gemini model tier (lite, flash, pro) per request from the content
+type, length, input size and live latency/error statistics, so cheap fast
+models handle the bulk of short jobs.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+TIER_ORDER = ["lite", "flash", "pro"]
+
+DEFAULT_TIERS = {
+    "lite": "gemini-2.5-flash-lite",
+    "flash": "gemini-2.5-flash",
+    "pro": "gemini-2.5-pro"
+}
+
+# Content types whose output is short whatever the requested length
+SHORT_CONTENT_TYPES = {"social", "ad"}
+
+# Highest tier a client may request unless a policy's "override_max" raises it
+DEFAULT_OVERRIDE_MAX = "flash"
+
+
+class ModelStats:
+    """Exponentially weighted latency and error rate for one model"""
+
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.calls = 0
+        self.latency = None
+        self.error_rate = 0.0
+        self.last_call = 0.0
+
+    def record(self, seconds, ok):
+        self.calls += 1
+        self.last_call = time.monotonic()
+        if ok:
+            self.latency = seconds if self.latency is None else \
+                self.latency + self.alpha * (seconds - self.latency)
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3)
+        }
+
+
+class ModelRouter:
+    """Choose a model per request within per-route policies"""
+
+    def __init__(self, tiers=None, policies=None, max_error_rate=0.25,
+                 latency_slo=None, min_calls=10, retry_after=60):
+        """
+        Args:
+            tiers: Dict of tier name -> model name
+            policies: Dict of route -> {"force", "min", "max", "allow_override",
+                "override_max"}; read from ROUTER_POLICY if not given
+            max_error_rate: Error rate above which a tier is avoided
+            latency_slo: Dict of tier -> seconds above which a tier is avoided
+            min_calls: Calls needed before live stats affect routing
+            retry_after: Seconds after which an avoided tier is tried again
+        """
+        self.tiers = tiers or {
+            tier: os.getenv(f"MODEL_{tier.upper()}", model)
+            for tier, model in DEFAULT_TIERS.items()
+        }
+        self.policies = policies if policies is not None else _load_policies()
+        self.max_error_rate = max_error_rate
+        self.latency_slo = latency_slo or {"lite": 10.0, "flash": 30.0, "pro": 60.0}
+        self.min_calls = min_calls
+        self.retry_after = retry_after
+
+        self._stats = {model: ModelStats() for model in self.tiers.values()}
+        self._lock = threading.Lock()
+
+    # ==================== Routing ====================
+
+    def choose(self, route, content_type=None, length=None, summary_type=None,
+               input_tokens=0, requested_tier=None):
+        """
+        Pick a tier and model for a request
+
+        Args:
+            route: "generate" or "summarize"
+            content_type: Content type for generation
+            length: Requested length for generation
+            summary_type: Summary type for summarization
+            input_tokens: Approximate size of the text sent to the model
+            requested_tier: Tier asked for by the client; honoured up to the
+                policy's "override_max" (flash by default)
+
+        Returns:
+            (tier, model_name) tuple
+        """
+        policy = self.policies.get(route, {})
+
+        if policy.get("force") in self.tiers:
+            tier = policy["force"]
+            return tier, self.tiers[tier]
+
+        if requested_tier in self.tiers and policy.get("allow_override", True):
+            tier = self._clamp(requested_tier, None, policy.get("override_max", DEFAULT_OVERRIDE_MAX))
+        elif route == "summarize":
+            tier = self._summary_tier(summary_type, input_tokens)
+        else:
+            tier = self._generation_tier(content_type, length)
+
+        tier = self._clamp(tier, policy.get("min"), policy.get("max"))
+        tier = self._healthy(tier, policy.get("min"), policy.get("max"))
+        return tier, self.tiers[tier]
+
+    def _generation_tier(self, content_type, length):
+        if length == "short" or content_type in SHORT_CONTENT_TYPES:
+            return "lite"
+        return "flash"
+
+    def _summary_tier(self, summary_type, input_tokens):
+        if input_tokens <= 3000 and summary_type != "abstract":
+            return "lite"
+        return "flash"
+
+    def _available(self):
+        return [t for t in TIER_ORDER if t in self.tiers]
+
+    def _clamp(self, tier, low, high):
+        order = self._available()
+        if tier not in order:
+            tier = "flash" if "flash" in order else order[0]
+        index = order.index(tier)
+        if low in order:
+            index = max(index, order.index(low))
+        if high in order:
+            index = min(index, order.index(high))
+        return order[index]
+
+    def _healthy(self, tier, low, high):
+        """Step to the nearest healthy tier within policy bounds"""
+        if self._is_healthy(tier):
+            return tier
+
+        order = self._available()
+        index = order.index(tier)
+        low_index = order.index(low) if low in order else 0
+        high_index = order.index(high) if high in order else len(order) - 1
+
+        # Prefer a cheaper tier, then a more capable one
+        candidates = list(range(index - 1, low_index - 1, -1)) + list(range(index + 1, high_index + 1))
+        for i in candidates:
+            if self._is_healthy(order[i]):
+                return order[i]
+        return tier
+
+    def _is_healthy(self, tier):
+        with self._lock:
+            stats = self._stats.get(self.tiers[tier])
+            if stats is None or stats.calls < self.min_calls:
+                return True
+            # Give an avoided tier another chance once its stats go stale
+            if time.monotonic() - stats.last_call > self.retry_after:
+                return True
+            if stats.error_rate > self.max_error_rate:
+                return False
+            slo = self.latency_slo.get(tier)
+            return not (slo and stats.latency is not None and stats.latency > slo)
+
+    # ==================== Stats ====================
+
+    def record(self, model, seconds, ok):
+        """Record the outcome of an upstream call"""
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is None:
+                stats = self._stats[model] = ModelStats()
+            stats.record(seconds, ok)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tiers": dict(self.tiers),
+                "models": {model: s.to_dict() for model, s in self._stats.items()}
+            }
+
+
+def _load_policies():
+    """Parse ROUTER_POLICY, falling back to no policies if it is malformed"""
+    raw = os.getenv('ROUTER_POLICY', '{}')
+    try:
+        policies = json.loads(raw)
+        if not isinstance(policies, dict) or not all(isinstance(p, dict) for p in policies.values()):
+            raise ValueError("expected an object of route -> policy objects")
+    except ValueError as e:
+        print(f"Ignoring invalid ROUTER_POLICY ({e}): {raw}")
+        return {}
+    return policies
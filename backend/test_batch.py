@@ -0,0 +1,176 @@
+"""
+Unit tests for the batch runner's checkpoint/resume logic
+Run with: python -m pytest test_batch.py
+"""
+
+import json
+
+from batch import Checkpoint, run_batch
+
+
+class FakeGenerator:
+    """Stands in for ContentGenerator; echoes the topic back"""
+
+    def __init__(self, fail_topics=()):
+        self.fail_topics = set(fail_topics)
+
+    def generate_content(self, content_type, topic, tone="professional", length="medium", **kwargs):
+        if topic == "boom":
+            raise RuntimeError("generator bug")
+        if topic in self.fail_topics:
+            return {"success": False, "error": "429 quota exceeded"}
+        return {"success": True, "content": topic.upper(), "model": "fake", "tokens_used": 1}
+
+    def summarize_content(self, text, summary_type="brief", ratio=0.3, **kwargs):
+        return {"success": True, "summary": text[:10], "model": "fake", "tokens_used": 1}
+
+
+def write_jobs(path, count):
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": f"j{i}", "content_type": "blog", "topic": f"topic {i}"}) + "\n")
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(raw)["line"] for raw in f]
+
+
+def test_out_of_order_marks_advance_watermark(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "out.ckpt"))
+    for line_no in (2, 3, 0):
+        checkpoint.mark(line_no)
+    assert checkpoint.watermark == 1
+    assert checkpoint.done == {2, 3}
+    assert checkpoint.is_done(3) and not checkpoint.is_done(1)
+
+    checkpoint.mark(1)
+    assert checkpoint.watermark == 4
+    assert checkpoint.done == set()
+
+
+def test_load_picks_up_results_written_after_last_save(tmp_path):
+    output = tmp_path / "out.jsonl"
+    checkpoint = Checkpoint(str(tmp_path / "out.ckpt"))
+    checkpoint.mark(0)
+    checkpoint.save()
+
+    # Lines 1 and 3 finished (out of order) after the checkpoint was saved
+    with open(output, "w") as f:
+        for line_no in (0, 3, 1):
+            f.write(json.dumps({"line": line_no, "id": None, "result": {}}) + "\n")
+
+    resumed = Checkpoint(checkpoint.path)
+    resumed.load(str(output))
+    assert resumed.watermark == 2
+    assert resumed.done == {3}
+    assert not resumed.is_done(2)
+
+
+def test_load_truncates_partial_last_line(tmp_path):
+    output = tmp_path / "out.jsonl"
+    with open(output, "w") as f:
+        f.write(json.dumps({"line": 0, "id": "j0", "result": {}}) + "\n")
+        f.write('{"line": 1, "id": "j1", "res')
+
+    checkpoint = Checkpoint(str(tmp_path / "out.ckpt"))
+    checkpoint.load(str(output))
+    assert checkpoint.watermark == 1
+    assert not checkpoint.is_done(1)
+    assert output.read_text().endswith("\n")
+    assert read_lines(output) == [0]
+
+
+def test_resume_after_crash_finishes_every_line_once(tmp_path):
+    jobs = tmp_path / "jobs.jsonl"
+    output = tmp_path / "out.jsonl"
+    write_jobs(jobs, 6)
+
+    # A crashed run: lines 0, 1 and 4 done, checkpoint saved at 1, half-written line 2
+    with open(output, "w") as f:
+        for line_no in (0, 1, 4):
+            f.write(json.dumps({"line": line_no, "id": f"j{line_no}", "result": {"success": True}}) + "\n")
+        f.write('{"line": 2, "id": "j2"')
+    with open(str(output) + ".ckpt", "w") as f:
+        json.dump({"watermark": 1}, f)
+
+    counts = run_batch(FakeGenerator(), str(jobs), str(output), concurrency=2)
+    assert counts["skipped"] == 3
+    assert counts["processed"] == 3
+    assert sorted(read_lines(output)) == list(range(6))
+
+    with open(str(output) + ".ckpt") as f:
+        assert json.load(f)["watermark"] == 6
+
+
+def read_results(path):
+    results = {}
+    with open(path) as f:
+        for raw in f:
+            entry = json.loads(raw)
+            results[entry["line"]] = entry["result"]
+    return results
+
+
+def test_poison_lines_fail_without_stopping_the_run(tmp_path):
+    jobs = tmp_path / "jobs.jsonl"
+    output = tmp_path / "out.jsonl"
+    with open(jobs, "w") as f:
+        f.write(json.dumps({"id": "a", "content_type": "blog", "topic": "fine"}) + "\n")
+        f.write(json.dumps({"id": "b", "content_type": "blog", "topic": 123}) + "\n")
+        f.write(json.dumps({"id": "c", "content_type": "blog", "topic": "boom"}) + "\n")
+        f.write(json.dumps({"id": "d", "text": ["not", "a", "string"]}) + "\n")
+        f.write(json.dumps({"id": "e", "content_type": "blog", "topic": "also fine"}) + "\n")
+
+    counts = run_batch(FakeGenerator(), str(jobs), str(output), retries=0)
+    assert counts == {"processed": 5, "succeeded": 2, "failed": 3, "skipped": 0}
+
+    results = read_results(output)
+    assert "must be strings" in results[1]["error"]
+    assert results[2]["error"] == "RuntimeError: generator bug"
+    assert "must be a string" in results[3]["error"]
+
+    # The failures are recorded, so a resume doesn't hit them again
+    counts = run_batch(FakeGenerator(), str(jobs), str(output), retries=0)
+    assert counts["skipped"] == 5 and counts["processed"] == 0
+
+
+def test_retry_failed_reruns_only_failed_lines(tmp_path):
+    jobs = tmp_path / "jobs.jsonl"
+    output = tmp_path / "out.jsonl"
+    write_jobs(jobs, 4)
+
+    counts = run_batch(FakeGenerator(fail_topics={"topic 1", "topic 2"}), str(jobs), str(output), retries=0)
+    assert counts["failed"] == 2
+
+    # A plain resume keeps failures as they are
+    counts = run_batch(FakeGenerator(), str(jobs), str(output), retries=0)
+    assert counts["processed"] == 0
+
+    counts = run_batch(FakeGenerator(fail_topics={"topic 2"}), str(jobs), str(output),
+                       retries=0, retry_failed=True)
+    assert counts == {"processed": 2, "succeeded": 1, "failed": 1, "skipped": 2}
+
+    counts = run_batch(FakeGenerator(), str(jobs), str(output), retries=0, retry_failed=True)
+    assert counts == {"processed": 1, "succeeded": 1, "failed": 0, "skipped": 3}
+    assert all(r["success"] for r in read_results(output).values())
+
+    with open(str(output) + ".ckpt") as f:
+        assert json.load(f)["watermark"] == 4
+
+
+def test_results_recorded_to_history(tmp_path):
+    class FakeHistory:
+        def __init__(self):
+            self.entries = []
+
+        def record(self, kind, input_text, output, **kwargs):
+            self.entries.append((kind, input_text, output, kwargs["params"]))
+
+    jobs = tmp_path / "jobs.jsonl"
+    write_jobs(jobs, 2)
+    history = FakeHistory()
+
+    run_batch(FakeGenerator(), str(jobs), str(tmp_path / "out.jsonl"), history=history)
+    assert sorted(e[1] for e in history.entries) == ["topic 0", "topic 1"]
+    assert all(e[0] == "generate" and e[3]["content_type"] == "blog" for e in history.entries)
@@ -0,0 +1,115 @@
+"""
+Unit tests for the per-worker Gemini client pool
+Run with: python -m pytest test_client_pool.py
+"""
+
+import threading
+
+import pytest
+from google.api_core import exceptions
+
+from cancellation import Cancelled
+from client_pool import ClientPool
+
+
+class FakeTransport:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self):
+        self.transport = FakeTransport()
+
+
+def make_pool(size=2, **kwargs):
+    created = []
+
+    def factory():
+        client = FakeClient()
+        created.append(client)
+        return client
+
+    return ClientPool("key", size=size, factory=factory, **kwargs), created
+
+
+def fail_with(pool, error):
+    with pytest.raises(type(error)):
+        with pool.client() as client:
+            raise error
+    return client
+
+
+def test_clients_are_reused():
+    pool, created = make_pool()
+    with pool.client() as first:
+        pass
+    with pool.client() as second:
+        pass
+    assert first is second
+    assert len(created) == 1
+    assert pool.stats()["reused"] == 1
+
+
+@pytest.mark.parametrize("error", [
+    exceptions.ResourceExhausted("429 quota exceeded"),
+    exceptions.InvalidArgument("400 bad request"),
+    exceptions.DeadlineExceeded("504 deadline exceeded"),
+    ValueError("response blocked by safety filters"),
+    Cancelled(),
+])
+def test_call_errors_keep_the_client(error):
+    pool, created = make_pool()
+    client = fail_with(pool, error)
+    assert not client.transport.closed
+    with pool.client() as again:
+        assert again is client
+    assert pool.stats()["discarded"] == 0
+
+
+def test_connection_errors_discard_the_client():
+    pool, created = make_pool()
+    client = fail_with(pool, exceptions.ServiceUnavailable("503 connection reset"))
+    assert client.transport.closed
+
+    with pool.client() as replacement:
+        assert replacement is not client
+    stats = pool.stats()
+    assert stats["discarded"] == 1
+    assert stats["open"] == 1
+    assert stats["opened_total"] == 2
+
+
+def test_pool_never_exceeds_size():
+    pool, created = make_pool(size=1, acquire_timeout=0.05)
+    borrowed = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.client():
+            borrowed.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    borrowed.wait(5)
+    with pytest.raises(TimeoutError):
+        with pool.client():
+            pass
+    release.set()
+    holder.join()
+
+    assert len(created) == 1
+    assert pool.stats()["waits"] == 1
+
+
+def test_close_closes_idle_clients():
+    pool, created = make_pool()
+    with pool.client():
+        pass
+    pool.close()
+    assert created[0].transport.closed
+    assert pool.stats()["open"] == 0
@@ -0,0 +1,79 @@
+"""
+Unit tests for extractive pre-compression
+Run with: python -m pytest test_compression.py
+"""
+
+from budget import estimate_tokens
+from compression import compress, dedupe_paragraphs, score_sentences
+
+
+ARTICLE = """Solar panels convert sunlight into electricity using photovoltaic cells. Solar power costs have fallen sharply over the last decade.
+
+Photovoltaic cells are made of silicon. Silicon solar cells now reach efficiencies above twenty percent. The weather was nice on Tuesday.
+
+Subscribe to our newsletter for more updates. Click here to share this article.
+
+Battery storage lets solar electricity be used after sunset. Storage costs are falling along with solar panel prices."""
+
+
+def test_near_duplicate_paragraphs_are_dropped():
+    paragraphs = [
+        "The quick brown fox jumps over the lazy dog near the river bank today.",
+        "Something entirely different about solar panels and batteries.",
+        "The quick brown fox jumps over the lazy dog near the river bank today!",
+    ]
+    kept, removed = dedupe_paragraphs(paragraphs)
+    assert removed == 1
+    assert kept == paragraphs[:2]
+
+
+def test_distinct_paragraphs_are_kept():
+    paragraphs = ["Alpha beta gamma delta.", "Epsilon zeta eta theta.", "Iota kappa lambda mu."]
+    assert dedupe_paragraphs(paragraphs) == (paragraphs, 0)
+
+
+def test_duplicates_removed_before_sentences_are_dropped():
+    text = ARTICLE + "\n\n" + ARTICLE.split("\n\n")[0]
+    compressed, stats = compress(text, 10_000)
+    assert stats["duplicate_paragraphs"] == 1
+    assert stats["sentences_dropped"] == 0
+    assert compressed.count("Solar panels convert sunlight") == 1
+
+
+def test_output_stays_within_target():
+    for target in (60, 40, 20):
+        compressed, stats = compress(ARTICLE, target)
+        assert estimate_tokens(compressed) <= target
+        assert stats["compressed_tokens"] == estimate_tokens(compressed)
+        assert stats["sentences_dropped"] > 0
+
+
+def test_low_value_sentences_go_first():
+    compressed, _ = compress(ARTICLE, 60)
+    assert "newsletter" not in compressed
+    assert "Click here" not in compressed
+    assert "Solar panels convert sunlight" in compressed
+
+
+def test_best_sentence_is_always_kept():
+    scored = score_sentences(ARTICLE.split("\n\n"))
+    best = max(scored, key=lambda s: s[2])[1]
+
+    compressed, _ = compress(ARTICLE, 1)
+    assert compressed
+    assert best.startswith(compressed)
+
+
+def test_oversized_single_sentence_is_trimmed_not_dropped():
+    compressed, _ = compress("word " * 100, 0)
+    assert compressed == "word"
+
+    compressed, _ = compress("word " * 100, 20)
+    assert 0 < estimate_tokens(compressed) <= 20
+
+
+def test_text_under_target_is_unchanged():
+    compressed, stats = compress(ARTICLE, 10_000)
+    assert stats["sentences_dropped"] == 0
+    assert stats["duplicate_paragraphs"] == 0
+    assert compressed.split() == ARTICLE.split()
@@ -0,0 +1,144 @@
+"""
+Unit tests for hedged upstream requests
+Run with: python -m pytest test_hedging.py
+"""
+
+import threading
+import time
+
+import pytest
+
+from cancellation import CancelToken, Cancelled
+from hedging import Hedger, HedgeBudget, size_bucket
+
+
+KEY = ("gemini-2.5-flash", "generate", "blog", "medium")
+
+
+def make_hedger(delay=0.02, budget_tokens=5):
+    """Hedger that hedges KEY after `delay` seconds with `budget_tokens` hedges available"""
+    hedger = Hedger(min_samples=2, max_workers=4)
+    for _ in range(2):
+        hedger.tracker.record(KEY, delay)
+    hedger.budget._tokens = budget_tokens
+    return hedger
+
+
+class Attempts:
+    """fn for Hedger.call whose n-th attempt follows the n-th behaviour"""
+
+    def __init__(self, *behaviours):
+        self.behaviours = list(behaviours)
+        self.tokens = []
+        self._lock = threading.Lock()
+
+    def __call__(self, token):
+        with self._lock:
+            self.tokens.append(token)
+            behaviour = self.behaviours[len(self.tokens) - 1]
+        return behaviour(token)
+
+
+def answer(value, after=0.0):
+    def run(token):
+        deadline = time.monotonic() + after
+        while time.monotonic() < deadline:
+            token.raise_if_cancelled()
+            time.sleep(0.005)
+        return value
+    return run
+
+
+def fail(error, after=0.0):
+    def run(token):
+        answer(None, after)(token)
+        raise error
+    return run
+
+
+def test_no_hedging_without_enough_samples():
+    hedger = Hedger(min_samples=2)
+    hedger.budget._tokens = 5
+    attempts = Attempts(answer("primary", after=0.1))
+    caller = threading.get_ident()
+    ran_in = []
+
+    def fn(token):
+        ran_in.append(threading.get_ident())
+        return attempts(token)
+
+    assert hedger.call(KEY, fn) == "primary"
+    assert len(attempts.tokens) == 1
+    assert ran_in == [caller]
+    assert hedger.stats()["hedges"] == 0
+
+
+def test_fast_primary_is_not_hedged():
+    hedger = make_hedger(delay=0.5)
+    attempts = Attempts(answer("primary"))
+    assert hedger.call(KEY, attempts) == "primary"
+    assert len(attempts.tokens) == 1
+    assert hedger.stats()["hedges"] == 0
+
+
+def test_slow_primary_is_hedged_and_loser_cancelled():
+    hedger = make_hedger()
+    attempts = Attempts(answer("primary", after=2.0), answer("backup"))
+
+    start = time.monotonic()
+    assert hedger.call(KEY, attempts) == "backup"
+    assert time.monotonic() - start < 1.0
+
+    primary_token, backup_token = attempts.tokens
+    assert primary_token.cancelled
+    assert not backup_token.cancelled
+    stats = hedger.stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_no_hedge_without_budget():
+    hedger = make_hedger(budget_tokens=0)
+    attempts = Attempts(answer("primary", after=0.1), answer("backup"))
+    assert hedger.call(KEY, attempts) == "primary"
+    assert len(attempts.tokens) == 1
+    assert hedger.stats()["hedges"] == 0
+
+
+def test_primary_error_falls_through_to_backup():
+    hedger = make_hedger()
+    attempts = Attempts(fail(RuntimeError("upstream 500"), after=0.05), answer("backup", after=0.1))
+    assert hedger.call(KEY, attempts) == "backup"
+    assert hedger.stats()["hedge_wins"] == 1
+
+
+def test_both_failing_raises_primary_error():
+    hedger = make_hedger()
+    attempts = Attempts(fail(RuntimeError("primary"), after=0.05), fail(RuntimeError("backup")))
+    with pytest.raises(RuntimeError, match="primary"):
+        hedger.call(KEY, attempts)
+
+
+def test_request_cancel_stops_both_attempts():
+    hedger = make_hedger()
+    request_token = CancelToken()
+    attempts = Attempts(answer("primary", after=2.0), answer("backup", after=2.0))
+    threading.Timer(0.1, request_token.cancel).start()
+    with pytest.raises(Cancelled):
+        hedger.call(KEY, attempts, request_token)
+    assert all(token.cancelled for token in attempts.tokens)
+
+
+def test_budget_earns_a_fraction_per_primary():
+    budget = HedgeBudget(ratio=0.5, burst=1)
+    assert not budget.try_acquire()
+    budget.on_primary()
+    budget.on_primary()
+    budget.on_primary()
+    assert budget.try_acquire()
+    assert not budget.try_acquire()
+
+
+def test_size_buckets():
+    assert size_bucket(10) == size_bucket(1000) == "<=1000"
+    assert size_bucket(1001) == "<=4000"
+    assert size_bucket(10 ** 6) == ">16000"
@@ -0,0 +1,236 @@
+"""
+Request Tracing & Sampling Profiler
+Lightweight per-request spans reported via the Server-Timing header and
+structured logs, plus an on-demand sampling profiler that writes
+flamegraph-compatible (folded stack) output.
+"""
+
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, request
+
+
+logger = logging.getLogger("tracing")
+
+_local = threading.local()
+
+
+class Trace:
+    """Spans recorded for a single request"""
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def add(self, name, duration_ms):
+        self.spans.append((name, duration_ms))
+
+    def total_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def server_timing(self):
+        """Format spans as a Server-Timing header value"""
+        parts = [f"{name};dur={ms:.1f}" for name, ms in self.spans]
+        parts.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(parts)
+
+
+def current_trace():
+    """Return the trace active on this thread, or None"""
+    return getattr(_local, "trace", None)
+
+
+def activate(trace):
+    """Make `trace` the active trace on this thread (None to clear)"""
+    _local.trace = trace
+
+
+@contextmanager
+def span(name):
+    """
+    Time a block and attach it to the active trace
+
+    A no-op apart from one attribute lookup when no trace is active, so it
+    is safe to leave around hot code paths.
+    """
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, (time.perf_counter() - start) * 1000)
+
+
+def _queue_time_ms(header):
+    """
+    Time a request spent queued before a worker picked it up
+
+    Reads an `X-Request-Start` header set by the proxy in front of gunicorn,
+    either `t=<seconds>` or `t=<microseconds>` since the epoch.
+    """
+    if not header:
+        return None
+    try:
+        value = float(header.split("=", 1)[-1])
+    except ValueError:
+        return None
+    if value > 1e14:        # microseconds
+        value /= 1e6
+    elif value > 1e11:      # milliseconds
+        value /= 1e3
+    return max((time.time() - value) * 1000, 0.0)
+
+
+def init_app(app):
+    """Register request hooks that trace every request"""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    @app.before_request
+    def _start_trace():
+        request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        trace = Trace(request_id)
+        queued = _queue_time_ms(request.headers.get("X-Request-Start"))
+        if queued is not None:
+            trace.add("queue", queued)
+        g.trace = trace
+        activate(trace)
+
+    @app.after_request
+    def _finish_trace(response):
+        trace = g.pop("trace", None)
+        activate(None)
+        if trace is None:
+            return response
+
+        response.headers["Server-Timing"] = trace.server_timing()
+        response.headers["Timing-Allow-Origin"] = "*"
+        response.headers["X-Request-ID"] = trace.request_id
+        logger.info(json.dumps({
+            "event": "request",
+            "request_id": trace.request_id,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(trace.total_ms(), 1),
+            "spans": {name: round(ms, 1) for name, ms in trace.spans}
+        }))
+        return response
+
+    @app.teardown_request
+    def _clear_trace(exc):
+        activate(None)
+
+
+class SamplingProfiler:
+    """
+    Periodically sample every thread's stack for a fixed duration
+
+    Nothing runs while the profiler is idle. Output is written in the folded
+    stack format understood by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, output_dir="profiles"):
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+        self._thread = None
+        self.last_output = None
+        self.started_at = None
+        self.ends_at = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds, interval=0.005):
+        """
+        Start sampling in the background
+
+        Args:
+            seconds: How long to sample for
+            interval: Seconds between samples
+
+        Returns:
+            Path the folded output will be written to, or None if already running
+        """
+        with self._lock:
+            if self.is_running():
+                return None
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"profile-{int(time.time())}-{os.getpid()}.folded")
+            self.started_at = time.time()
+            self.ends_at = self.started_at + seconds
+            self._thread = threading.Thread(
+                target=self._run, args=(seconds, interval, path),
+                name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+            return path
+
+    def _run(self, seconds, interval, path):
+        own_id = threading.get_ident()
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stacks[_fold(frame)] += 1
+            time.sleep(interval)
+
+        # Write then rename, so other workers never serve a half-written file
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(tmp, path)
+        self.last_output = path
+
+    def latest_output(self):
+        """Newest finished profile in output_dir, written by any worker"""
+        paths = glob.glob(os.path.join(self.output_dir, "profile-*.folded"))
+        return max(paths, key=os.path.getmtime, default=None)
+
+    def status(self):
+        """
+        State of this worker's profiler
+
+        `running`, `started_at` and `ends_at` describe this worker only;
+        `latest_output` is the newest profile from any worker sharing
+        output_dir.
+        """
+        return {
+            "pid": os.getpid(),
+            "running": self.is_running(),
+            "started_at": self.started_at,
+            "ends_at": self.ends_at,
+            "last_output": self.last_output,
+            "latest_output": self.latest_output()
+        }
+
+
+def _fold(frame):
+    """Collapse a frame chain into a root-first `a;b;c` stack string"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
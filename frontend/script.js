@@ -10,10 +10,26 @@ const inputText = document.getElementById('inputText');
 const wordCountSpan = document.getElementById('wordCount');
 const toast = document.getElementById('toast');
 
+// ==================== Request State ====================
+// Each cached response is its own sessionStorage item under this prefix, plus
+// an index of [key, size] pairs, oldest first
+const CACHE_STORAGE_KEY = 'contentGenCache';
+const CACHE_MAX_CHARS = 1024 * 1024;
+const WORD_COUNT_DEBOUNCE_MS = 150;
+
+// One pending request per form: { controller, requestId, key }
+const inFlight = { generate: null, summarize: null };
+// key -> { size, data }; data is read from sessionStorage on first use
+const responseCache = loadCache();
+
+let wordCountWorker = null;
+let wordCountSeq = 0;
+
 // ==================== Initialize ====================
 document.addEventListener('DOMContentLoaded', () => {
     setupTabs();
     setupForms();
+    setupCancellation();
     setupWordCount();
     checkAPIHealth();
 });
@@ -68,52 +84,272 @@ function setupForms() {
 }
 
 // ==================== Word Count ====================
+// Counts whitespace-separated words in a single pass without building an
+// array, so it stays cheap on very large pasted documents
+function countWords(text) {
+    let words = 0;
+    let inWord = false;
+    for (let i = 0; i < text.length; i++) {
+        const c = text.charCodeAt(i);
+        const isSpace = c <= 32 || c === 160 || c === 0x1680 || (c >= 0x2000 && c <= 0x200a) ||
+            c === 0x2028 || c === 0x2029 || c === 0x202f || c === 0x205f || c === 0x3000 || c === 0xfeff;
+        if (isSpace) {
+            inWord = false;
+        } else if (!inWord) {
+            inWord = true;
+            words++;
+        }
+    }
+    return words;
+}
+
 function setupWordCount() {
+    // Count off the main thread; fall back to inline counting if workers are unavailable
+    try {
+        const source = `${countWords.toString()}
+self.onmessage = (e) => self.postMessage({ seq: e.data.seq, words: countWords(e.data.text) });`;
+        wordCountWorker = new Worker(URL.createObjectURL(new Blob([source], { type: 'text/javascript' })));
+        wordCountWorker.onmessage = (e) => {
+            // Ignore results for text that has since changed
+            if (e.data.seq === wordCountSeq) {
+                renderWordCount(e.data.words);
+            }
+        };
+        wordCountWorker.onerror = () => {
+            wordCountWorker = null;
+            updateWordCount();
+        };
+    } catch (error) {
+        wordCountWorker = null;
+    }
+
+    let timer = null;
     inputText.addEventListener('input', () => {
-        const text = inputText.value.trim();
-        const words = text ? text.split(/\s+/).length : 0;
-        wordCountSpan.textContent = `${words} words`;
-        
-        if (words > 0 && words < 50) {
-            wordCountSpan.style.color = 'var(--warning)';
-        } else {
-            wordCountSpan.style.color = 'var(--gray)';
-        }
+        clearTimeout(timer);
+        timer = setTimeout(updateWordCount, WORD_COUNT_DEBOUNCE_MS);
     });
 }
 
-// ==================== Handle Content Generation ====================
-async function handleGenerate() {
-    const contentType = document.getElementById('contentType').value;
-    const topic = document.getElementById('topic').value;
-    const tone = document.getElementById('tone').value;
-    const length = document.getElementById('length').value;
+function updateWordCount() {
+    const text = inputText.value;
+    if (wordCountWorker) {
+        wordCountWorker.postMessage({ seq: ++wordCountSeq, text: text });
+    } else {
+        renderWordCount(countWords(text));
+    }
+}
+
+function renderWordCount(words) {
+    wordCountSpan.textContent = `${words} words`;
+    
+    if (words > 0 && words < 50) {
+        wordCountSpan.style.color = 'var(--warning)';
+    } else {
+        wordCountSpan.style.color = 'var(--gray)';
+    }
+}
 
-    const btn = document.getElementById('generateBtn');
-    const btnText = btn.querySelector('.btn-text');
-    const loader = btn.querySelector('.loader');
+// ==================== Request Management ====================
+function setupCancellation() {
+    // Changing any parameter abandons the request made with the old ones
+    ['input', 'change'].forEach(eventName => {
+        generateForm.addEventListener(eventName, () => cancelInFlight('generate'));
+        summarizeForm.addEventListener(eventName, () => cancelInFlight('summarize'));
+    });
+}
 
+function newRequestId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+function cancelInFlight(name) {
+    const pending = inFlight[name];
+    if (!pending) {
+        return;
+    }
+    inFlight[name] = null;
+    pending.controller.abort();
+    resetButton(name);
+
+    // Tell the backend too, so the upstream model call stops consuming quota
+    fetch(`${API_BASE_URL}/cancel`, {
+        method: 'POST',
+        keepalive: true,
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ request_id: pending.requestId })
+    }).catch(() => {});
+}
+
+/**
+ * Short key for a request. Summarize params hold the whole pasted document,
+ * so the params are hashed rather than used as the key.
+ */
+async function cacheKey(endpoint, params) {
+    const body = JSON.stringify([endpoint, params]);
+    if (window.crypto && crypto.subtle) {
+        const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(body));
+        return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+    }
+    // crypto.subtle needs a secure context; fall back to two 32-bit FNV-1a hashes
+    let h1 = 0x811c9dc5;
+    let h2 = 0x01000193;
+    for (let i = 0; i < body.length; i++) {
+        const c = body.charCodeAt(i);
+        h1 = Math.imul(h1 ^ c, 0x01000193);
+        h2 = Math.imul(h2 ^ c, 0x5bd1e995);
+    }
+    return `${(h1 >>> 0).toString(16)}${(h2 >>> 0).toString(16)}-${body.length}`;
+}
+
+function loadCache() {
     try {
-        // Show loading state
-        btn.disabled = true;
-        btnText.textContent = 'Generating...';
-        loader.style.display = 'block';
+        return new Map((JSON.parse(sessionStorage.getItem(CACHE_STORAGE_KEY)) || [])
+            .filter(([key, size]) => typeof size === 'number')
+            .map(([key, size]) => [key, { size, data: null }]));
+    } catch (error) {
+        return new Map();
+    }
+}
+
+function getCached(key) {
+    const entry = responseCache.get(key);
+    if (!entry) {
+        return null;
+    }
+    if (entry.data === null) {
+        try {
+            entry.data = JSON.parse(sessionStorage.getItem(`${CACHE_STORAGE_KEY}:${key}`));
+        } catch (error) {
+            entry.data = null;
+        }
+        if (entry.data === null) {
+            responseCache.delete(key);
+            return null;
+        }
+    }
+    return entry.data;
+}
+
+function putCached(key, data) {
+    // Serialise only the new response; older ones are already stored
+    const value = JSON.stringify(data);
+    if (value.length > CACHE_MAX_CHARS) {
+        return;
+    }
+    responseCache.delete(key);
+    responseCache.set(key, { size: value.length, data });
+
+    let total = 0;
+    responseCache.forEach(entry => { total += entry.size; });
+    while (total > CACHE_MAX_CHARS) {
+        const [oldest, entry] = responseCache.entries().next().value;
+        responseCache.delete(oldest);
+        total -= entry.size;
+        try {
+            sessionStorage.removeItem(`${CACHE_STORAGE_KEY}:${oldest}`);
+        } catch (error) {
+            // Storage unavailable
+        }
+    }
+
+    try {
+        sessionStorage.setItem(`${CACHE_STORAGE_KEY}:${key}`, value);
+        sessionStorage.setItem(CACHE_STORAGE_KEY,
+            JSON.stringify([...responseCache].map(([k, entry]) => [k, entry.size])));
+    } catch (error) {
+        // Storage full or unavailable - the in-memory cache still works
+    }
+}
+
+/**
+ * POST to the API with cancellation and a session cache.
+ * Resolves to { data, cached }, or null when an identical request is already pending.
+ * Rejects with an AbortError if the request is cancelled.
+ */
+async function postJSON(name, endpoint, params) {
+    const key = await cacheKey(endpoint, params);
+
+    const cachedData = getCached(key);
+    if (cachedData) {
+        cancelInFlight(name);
+        return { data: cachedData, cached: true };
+    }
+    if (inFlight[name] && inFlight[name].key === key) {
+        return null;
+    }
+
+    cancelInFlight(name);
+    const controller = new AbortController();
+    const requestId = newRequestId();
+    inFlight[name] = { controller, requestId, key };
 
-        const response = await fetch(`${API_BASE_URL}/generate`, {
+    try {
+        const response = await fetch(`${API_BASE_URL}/${endpoint}`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'X-Request-ID': requestId,
             },
-            body: JSON.stringify({
-                content_type: contentType,
-                topic: topic,
-                tone: tone,
-                length: length
-            })
+            body: JSON.stringify(params),
+            signal: controller.signal
         });
 
         const data = await response.json();
 
+        if (data.success) {
+            putCached(key, data);
+        }
+        return { data, cached: false };
+    } finally {
+        if (inFlight[name] && inFlight[name].controller === controller) {
+            inFlight[name] = null;
+        }
+    }
+}
+
+const BUTTON_LABELS = {
+    generate: { id: 'generateBtn', idle: 'Generate Content', busy: 'Generating...' },
+    summarize: { id: 'summarizeBtn', idle: 'Summarize Text', busy: 'Summarizing...' }
+};
+
+function setButtonBusy(name) {
+    const labels = BUTTON_LABELS[name];
+    const btn = document.getElementById(labels.id);
+    btn.querySelector('.btn-text').textContent = labels.busy;
+    btn.querySelector('.loader').style.display = 'block';
+}
+
+function resetButton(name) {
+    const labels = BUTTON_LABELS[name];
+    const btn = document.getElementById(labels.id);
+    btn.querySelector('.btn-text').textContent = labels.idle;
+    btn.querySelector('.loader').style.display = 'none';
+}
+
+// ==================== Handle Content Generation ====================
+async function handleGenerate() {
+    const params = {
+        content_type: document.getElementById('contentType').value,
+        topic: document.getElementById('topic').value,
+        tone: document.getElementById('tone').value,
+        length: document.getElementById('length').value
+    };
+
+    try {
+        // Show loading state
+        setButtonBusy('generate');
+
+        const result = await postJSON('generate', 'generate', params);
+        if (!result) {
+            return;
+        }
+        const data = result.data;
+
         if (data.success) {
             // Display generated content
             document.getElementById('generatedContent').textContent = data.content;
@@ -126,18 +362,21 @@ async function handleGenerate() {
                 block: 'nearest' 
             });
             
-            showToast('Content generated successfully!', 'success');
+            showToast(result.cached ? 'Loaded from this session\'s cache' : 'Content generated successfully!', 'success');
         } else {
             showToast(`Error: ${data.error}`, 'error');
         }
     } catch (error) {
+        if (error.name === 'AbortError') {
+            return;
+        }
         console.error('Error:', error);
         showToast('Failed to generate content. Please check your API configuration.', 'error');
     } finally {
-        // Reset button state
-        btn.disabled = false;
-        btnText.textContent = 'Generate Content';
-        loader.style.display = 'none';
+        // Reset button state unless a newer request is still running
+        if (!inFlight.generate) {
+            resetButton('generate');
+        }
     }
 }
 
@@ -147,34 +386,24 @@ async function handleSummarize() {
     const summaryType = document.getElementById('summaryType').value;
 
     // Validate word count
-    const wordCount = text.split(/\s+/).length;
+    const wordCount = countWords(text);
     if (wordCount < 50) {
         showToast('Text must be at least 50 words long', 'error');
         return;
     }
 
-    const btn = document.getElementById('summarizeBtn');
-    const btnText = btn.querySelector('.btn-text');
-    const loader = btn.querySelector('.loader');
-
     try {
         // Show loading state
-        btn.disabled = true;
-        btnText.textContent = 'Summarizing...';
-        loader.style.display = 'block';
+        setButtonBusy('summarize');
 
-        const response = await fetch(`${API_BASE_URL}/summarize`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                text: text,
-                summary_type: summaryType
-            })
+        const result = await postJSON('summarize', 'summarize', {
+            text: text,
+            summary_type: summaryType
         });
-
-        const data = await response.json();
+        if (!result) {
+            return;
+        }
+        const data = result.data;
 
         if (data.success) {
             // Display summary
@@ -190,18 +419,21 @@ async function handleSummarize() {
                 block: 'nearest' 
             });
             
-            showToast('Text summarized successfully!', 'success');
+            showToast(result.cached ? 'Loaded from this session\'s cache' : 'Text summarized successfully!', 'success');
         } else {
             showToast(`Error: ${data.error}`, 'error');
         }
     } catch (error) {
+        if (error.name === 'AbortError') {
+            return;
+        }
         console.error('Error:', error);
         showToast('Failed to summarize text. Please check your API configuration.', 'error');
     } finally {
-        // Reset button state
-        btn.disabled = false;
-        btnText.textContent = 'Summarize Text';
-        loader.style.display = 'none';
+        // Reset button state unless a newer request is still running
+        if (!inFlight.summarize) {
+            resetButton('summarize');
+        }
     }
 }
 